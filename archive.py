@@ -0,0 +1,265 @@
+"""
+Message archival and partition upkeep.
+
+Messages older than ARCHIVE_AFTER_DAYS move out of the hot `messages` table
+into zlib-compressed per-chat chunks in `message_archives`, so the hot table
+only ever holds recent traffic. `chat.archived_through_id` marks how far a
+chat's archive reaches: `GET /chats/{chat_id}/messages` reads through to the
+archive once a page runs past it, and the inbox falls back to the chat's
+newest chunk when it has no hot messages left.
+
+Archived ids are always lower than hot ids, because archival takes every
+message below one id boundary.
+
+On Postgres `messages` is partitioned by id range (see models.py). Archival
+works in whole partitions: the boundary is the end of the newest partition
+that is entirely older than the cutoff, and once its rows are archived the
+partitions below it are dropped. Other dialects delete the archived rows.
+
+Partition upkeep does not depend on archival and has to run either way:
+
+    python archive.py partitions          # create upcoming partitions
+    python archive.py archive             # one archival pass
+    python archive.py archive --days 30   # override ARCHIVE_AFTER_DAYS
+
+Run both from cron, or set ARCHIVE_INTERVAL_SECONDS to run them inside a
+long-lived app process. Overlapping passes are safe: each chunk locks its
+chat row and only moves the chat's cursor from where the chunk started.
+"""
+import asyncio
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import orjson
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, get_engine
+from models import Chat, Message, MessageArchive, ensure_message_partitions, message_partitions
+from responses import dumps
+
+logger = logging.getLogger("uvicorn.error")
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "500"))  # Messages per compressed chunk
+
+
+def _pack(rows: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(dumps(rows))
+
+
+def _unpack(payload: bytes) -> List[Dict[str, Any]]:
+    return orjson.loads(zlib.decompress(payload))
+
+
+def _partition_boundary(connection, cutoff: datetime) -> int:
+    # Walk partitions oldest first while their newest message is older than
+    # the cutoff; never past the partition currently taking inserts
+    newest = connection.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar()
+    boundary = 0
+    for name, (start, end) in sorted(message_partitions(connection).items(), key=lambda item: item[1]):
+        if end > newest:
+            break
+        latest = connection.execute(text(f"SELECT timestamp FROM {name} ORDER BY id DESC LIMIT 1")).scalar()
+        if latest is not None and latest >= cutoff:
+            break
+        boundary = end
+    return boundary
+
+
+async def archive_boundary(db: AsyncSession, cutoff: datetime) -> int:
+    """Exclusive upper id bound of the messages to archive: everything below it is older than `cutoff`."""
+    if db.bind.dialect.name == "postgresql":
+        return await (await db.connection()).run_sync(_partition_boundary, cutoff)
+
+    boundary = await db.scalar(select(func.min(Message.id)).filter(Message.timestamp >= cutoff))
+    if boundary is None:
+        boundary = (await db.scalar(select(func.max(Message.id))) or 0) + 1
+    return boundary
+
+
+async def _chats_below(db: AsyncSession, boundary: int) -> List[int]:
+    # Chats with messages below the boundary that aren't archived yet
+    result = await db.execute(
+        select(Message.chat_id)
+        .join(Chat, Chat.id == Message.chat_id)
+        .filter(Message.id < boundary, Message.id > func.coalesce(Chat.archived_through_id, 0))
+        .distinct()
+    )
+    return list(result.scalars())
+
+
+async def archive_chat(db: AsyncSession, chat_id: int, boundary: int, delete_rows: bool = True) -> int:
+    """
+    Move a chat's messages below `boundary` into archive chunks. Returns the
+    number moved. With `delete_rows` off the hot rows stay until their
+    partition is dropped; reads skip them via `archived_through_id`.
+    """
+    moved = 0
+    while True:
+        # Each chunk's transaction locks the chat row first, so a concurrent
+        # pass (another worker, cron) waits here and then reads the moved cursor
+        archived_through = await db.scalar(
+            select(Chat.archived_through_id).filter(Chat.id == chat_id).with_for_update()
+        ) or 0
+        result = await db.execute(
+            select(Message.id, Message.chat_id, Message.sender_id, Message.content, Message.timestamp)
+            .filter(Message.chat_id == chat_id, Message.id > archived_through, Message.id < boundary)
+            .order_by(Message.id)
+            .limit(ARCHIVE_CHUNK_SIZE)
+        )
+        rows = [dict(row) for row in result.mappings()]
+        if not rows:
+            await db.commit()
+            return moved
+
+        ids = [row["id"] for row in rows]
+        last = rows[-1]
+        # One transaction per chunk: the archive row, the delete and the
+        # cursor move land together, and locks are held only briefly
+        await db.execute(
+            insert(MessageArchive).values(
+                chat_id=chat_id,
+                first_message_id=ids[0],
+                last_message_id=ids[-1],
+                message_count=len(ids),
+                last_sender_id=last["sender_id"],
+                last_timestamp=last["timestamp"],
+                last_content=last["content"],
+                payload=_pack(rows),
+            )
+        )
+        if delete_rows:
+            await db.execute(delete(Message).filter(Message.id.in_(ids)))
+        # Chunks go oldest first, so the newest archived id only ever grows.
+        # The cursor only moves from where this chunk started; SQLite has no
+        # row locks, so a pass that lost the race drops its chunk and rereads
+        cursor = await db.execute(
+            update(Chat)
+            .filter(Chat.id == chat_id, func.coalesce(Chat.archived_through_id, 0) == archived_through)
+            .values(archived_through_id=ids[-1])
+            .execution_options(synchronize_session=False)
+        )
+        if cursor.rowcount == 0:
+            await db.rollback()
+            continue
+        await db.commit()
+        moved += len(ids)
+
+
+async def load_archived(
+    db: AsyncSession,
+    chat_id: int,
+    limit: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` archived messages of a chat, oldest first: the newest ones
+    below `before` (or overall), or the oldest ones above `after`.
+
+    Only the chunks overlapping the requested range are read and decompressed.
+    """
+    query = select(MessageArchive.payload).filter(MessageArchive.chat_id == chat_id)
+    if after is not None:
+        query = query.filter(MessageArchive.last_message_id > after).order_by(MessageArchive.last_message_id.asc())
+    else:
+        if before is not None:
+            query = query.filter(MessageArchive.first_message_id < before)
+        query = query.order_by(MessageArchive.last_message_id.desc())
+
+    collected: List[Dict[str, Any]] = []
+    for payload in (await db.execute(query)).scalars():
+        rows = _unpack(payload)
+        if after is not None:
+            collected.extend(row for row in rows if row["id"] > after)
+        else:
+            collected.extend(row for row in reversed(rows) if before is None or row["id"] < before)
+        if len(collected) >= limit:
+            break
+
+    collected = collected[:limit]
+    if after is None:
+        collected.reverse()
+    return collected
+
+
+def drop_archived_partitions(connection, boundary: int) -> List[str]:
+    """Drop `messages` partitions that end at or below `boundary` and hold nothing unarchived. Sync connection, Postgres only."""
+    dropped = []
+    for name, (start, end) in message_partitions(connection).items():
+        if end > boundary:
+            continue
+        unarchived = connection.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {name} m JOIN chats c ON c.id = m.chat_id "
+            f"WHERE m.id > coalesce(c.archived_through_id, 0))"
+        )).scalar()
+        if unarchived:
+            continue
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+async def maintain_partitions() -> List[str]:
+    """Create upcoming `messages` partitions; a no-op off Postgres. Returns the partitions created."""
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        return []
+    async with engine.begin() as conn:
+        created = await conn.run_sync(ensure_message_partitions)
+    if created:
+        logger.info(f"Created message partitions: {', '.join(created)}")
+    return created
+
+
+async def archive_old_messages(after_days: int = ARCHIVE_AFTER_DAYS) -> Dict[str, int]:
+    """One archival pass over every message older than `after_days`, then drops the partitions it emptied."""
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    engine = get_engine()
+    partitioned = engine.dialect.name == "postgresql"
+    chats = moved = 0
+    async with SessionLocal() as db:
+        boundary = await archive_boundary(db, cutoff)
+        for chat_id in await _chats_below(db, boundary):
+            moved += await archive_chat(db, chat_id, boundary, delete_rows=not partitioned)
+            chats += 1
+
+    dropped: List[str] = []
+    if partitioned:
+        async with engine.begin() as conn:
+            dropped = await conn.run_sync(drop_archived_partitions, boundary)
+    logger.info(f"Archived {moved} messages from {chats} chats; dropped {len(dropped)} partitions")
+    return {"chats": chats, "messages": moved, "partitions_dropped": len(dropped)}
+
+
+async def run_periodically(interval: int) -> None:
+    while True:
+        for task in (maintain_partitions, archive_old_messages):
+            try:
+                await task()
+            except Exception as e:
+                logger.error(f"{task.__name__} failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _main(args) -> Any:
+    try:
+        if args.command == "partitions":
+            return await maintain_partitions()
+        return await archive_old_messages(args.days)
+    finally:
+        await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Message archival and partition upkeep")
+    parser.add_argument("command", nargs="?", choices=("archive", "partitions"), default="archive")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="age before a message is archived")
+    args = parser.parse_args()
+    print(asyncio.run(_main(args)))
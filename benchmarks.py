@@ -0,0 +1,554 @@
+"""
+Before/after benchmarks for the HiveMind API.
+
+Each benchmark serves the app from a separate uvicorn process against the
+database seeded by loadtest.py and drives it over HTTP. Server-side costs
+can then be read from /proc, and older checkouts can be measured against the
+same data:
+
+    python loadtest.py seed --users 5000 --chats 20000 --messages 200000
+    git worktree add /tmp/hivemind-before <commit>
+    python benchmarks.py throughput --app-dir /tmp/hivemind-before --db-latency-ms 5
+    python benchmarks.py throughput --db-latency-ms 5
+
+--db-latency-ms delays every SQL statement, standing in for the network
+round trip to a real database that a local SQLite file doesn't have. Older
+checkouts hard-code a Postgres URL, so `serve` points any engine the app
+creates at the benchmark database.
+
+Linux only: server CPU and memory come from /proc.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from loadtest import (
+    BENCH_PASSWORD, DEFAULT_DATABASE_URL, WORDS, Recorder, _configure_database, _print_report, _sample, _sentence,
+    summarize,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_JWT_SECRET = "benchmark-secret"
+SERVER_START_TIMEOUT = 30
+
+
+def _sqlite_path(url: str) -> str:
+    return os.path.abspath(url.split(":///", 1)[1])
+
+
+def serve(args) -> None:
+    """Run the app in --app-dir under uvicorn. Started by Server; not meant to be run by hand."""
+    import sqlite3
+
+    import sqlalchemy
+    import sqlalchemy.ext.asyncio
+    import uvicorn
+
+    path = _sqlite_path(args.database_url)
+    create_engine = sqlalchemy.create_engine
+    create_async_engine = sqlalchemy.ext.asyncio.create_async_engine
+
+    # Whatever URL the checkout names, its engine gets the benchmark database
+    def bench_engine(url, **options):
+        options.pop("connect_args", None)
+        return create_engine(f"sqlite:///{path}", **options)
+
+    def bench_async_engine(url, **options):
+        options.pop("connect_args", None)
+        return create_async_engine(f"sqlite+aiosqlite:///{path}", **options)
+
+    sqlalchemy.create_engine = bench_engine
+    sqlalchemy.ext.asyncio.create_async_engine = bench_async_engine
+
+    if args.db_latency_ms:
+        delay = args.db_latency_ms / 1000
+        connect = sqlite3.connect
+
+        def slow_connect(*connect_args, **connect_kwargs):
+            connection = connect(*connect_args, **connect_kwargs)
+            previous = [None]
+
+            def on_statement(statement: str) -> None:
+                # Only statements the app sends cost a round trip. Trigger
+                # bodies report as comments, a statement reports again each
+                # time its triggers return to it, and FTS5's own statements
+                # name its shadow tables as 'main'.'<table>_...'
+                if statement.startswith("--") or statement == previous[0] or "'main'.'" in statement:
+                    return
+                previous[0] = statement
+                time.sleep(delay)
+
+            connection.set_trace_callback(on_statement)
+            return connection
+
+        sqlite3.connect = sqlite3.dbapi2.connect = slow_connect
+
+    # The checkout's modules must win over this directory's
+    app_dir = os.path.abspath(args.app_dir)
+    sys.path[:] = [app_dir] + [entry for entry in sys.path if os.path.abspath(entry or ".") != HERE]
+    from main import app
+
+    if args.hash_inline:
+        # How login behaved with bcrypt called straight from the handler
+        import security
+
+        async def run_inline(fn, *fn_args):
+            return fn(*fn_args)
+
+        security.hashing_pool.run = run_inline
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+class Server:
+    """A uvicorn process serving a checkout of the app against the benchmark database."""
+
+    def __init__(
+        self,
+        database_url: str,
+        app_dir: str = HERE,
+        db_latency_ms: float = 0,
+        env: Optional[Dict[str, str]] = None,
+        hash_inline: bool = False,
+    ):
+        self.database_url = database_url
+        self.app_dir = app_dir
+        self.db_latency_ms = db_latency_ms
+        self.hash_inline = hash_inline
+        self.env = env or {}
+        self.process: Optional[subprocess.Popen] = None
+        self.url = ""
+
+    def __enter__(self) -> "Server":
+        import httpx
+
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        env = {
+            **os.environ,
+            "DATABASE_URL": self.database_url,
+            "JWT_SECRET_KEY": BENCH_JWT_SECRET,
+            "DB_POOL_MODE": "queue",
+            "SLOW_QUERY_MS": "100000",
+            **self.env,
+        }
+        self.process = subprocess.Popen([
+            sys.executable, os.path.join(HERE, "benchmarks.py"), "--database-url", self.database_url,
+            "serve", "--app-dir", self.app_dir, "--port", str(port), "--db-latency-ms", str(self.db_latency_ms),
+            *(["--hash-inline"] if self.hash_inline else []),
+        ], env=env)
+        self.url = f"http://127.0.0.1:{port}"
+
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                httpx.get(f"{self.url}/", timeout=1)
+                return self
+            except httpx.HTTPError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError(f"Server for {self.app_dir} did not start")
+                time.sleep(0.2)
+
+    def memory_mb(self, field: str = "VmRSS") -> float:
+        """A memory figure of the server process; VmHWM is its peak RSS so far."""
+        with open(f"/proc/{self.process.pid}/status") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+        raise KeyError(field)
+
+    def cpu_seconds(self) -> float:
+        """User plus system CPU time the server process has used so far."""
+        with open(f"/proc/{self.process.pid}/stat") as stat:
+            # Fields after the parenthesised command name; utime and stime are 14th and 15th
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def __exit__(self, *exc_info) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # A blocked event loop never gets to handle the signal
+                self.process.kill()
+                self.process.wait()
+
+
+async def _auth_headers(client, username: str) -> Dict[str, str]:
+    response = await client.post("/login", data={"username": username, "password": BENCH_PASSWORD})
+    if response.status_code == 200:
+        token = response.json()["access_token"]
+    else:
+        # Checkouts that verify through passlib can't read hashes made with
+        # bcrypt>=5, so sign the token here with the server's secret instead.
+        # Checkouts from before signed tokens ignore the header anyway.
+        from sqlalchemy import select
+
+        from database import SessionLocal
+        from models import User
+        from security import create_access_token
+
+        async with SessionLocal() as db:
+            user = (await db.execute(select(User.id, User.isTutor).filter(User.username == username))).one()
+        token, _ = create_access_token(user.id, username, user.isTutor)
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _drive(concurrency: int, duration: float, request) -> Dict[str, Dict[str, float]]:
+    """Run `request()` from `concurrency` workers for `duration` seconds and summarize it."""
+    recorder = Recorder()
+
+    async def worker(deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            route, call = request()
+            start = time.perf_counter()
+            try:
+                response = await call()
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            recorder.record(route, time.perf_counter() - start, ok)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(start + duration) for _ in range(concurrency)))
+    return summarize(recorder, time.perf_counter() - start)
+
+
+async def throughput(args) -> int:
+    """Concurrent GET /chats/{chat_id}/messages: the request pattern a blocking database call stalls."""
+    import httpx
+
+    sample = await _sample(args.chats)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    with Server(args.database_url, args.app_dir, args.db_latency_ms) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=60,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            chats = sample["chats"]
+            headers = {chat.tutor_id: await _auth_headers(client, sample["users"][chat.tutor_id]) for chat in chats}
+
+            def request():
+                chat = rng.choice(chats)
+                return "GET /chats/{chat_id}/messages", lambda: client.get(
+                    f"/chats/{chat.id}/messages", headers=headers[chat.tutor_id]
+                )
+
+            report = await _drive(args.concurrency, args.duration, request)
+
+    print(f"{args.app_dir}: concurrency {args.concurrency}, db latency {args.db_latency_ms} ms")
+    _print_report(report)
+    return 0
+
+
+async def batch(args) -> int:
+    """Messages per second through POST /messages/ one at a time, or POST /messages/batch."""
+    import httpx
+
+    sample = await _sample(args.chats)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    per_request = 1 if args.batch_size is None else args.batch_size
+    requests = -(-args.messages // per_request)
+
+    with Server(args.database_url, args.app_dir, args.db_latency_ms) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=60) as client:
+            chats = sample["chats"]
+            headers = {chat.tutor_id: await _auth_headers(client, sample["users"][chat.tutor_id]) for chat in chats}
+            pending = iter(range(requests))
+
+            async def worker() -> None:
+                for _ in pending:
+                    chat = rng.choice(chats)
+                    if args.batch_size is None:
+                        route, path, body = "POST /messages/", "/messages/", {"chat_id": chat.id, "content": _sentence(rng)}
+                    else:
+                        route, path = "POST /messages/batch", "/messages/batch"
+                        body = {"messages": [{"chat_id": chat.id, "content": _sentence(rng)} for _ in range(per_request)]}
+                    start = time.perf_counter()
+                    response = await client.post(path, json=body, headers=headers[chat.tutor_id])
+                    recorder.record(route, time.perf_counter() - start, response.status_code < 400)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+    print(f"{args.app_dir}: {requests * per_request} messages, {per_request} per request, "
+          f"concurrency {args.concurrency}, db latency {args.db_latency_ms} ms")
+    _print_report(summarize(recorder, elapsed))
+    print(f"{requests * per_request / elapsed:.1f} messages/s")
+    return 0
+
+
+async def _search_client_side(client, user_id: int, headers: Dict[str, str], terms: List[str]) -> List[int]:
+    # Without a search endpoint: page through every chat's history and filter locally
+    chats = (await client.get(f"/chats/{user_id}", params={"limit": 200}, headers=headers)).json()
+    matches = []
+    for chat in chats:
+        before = None
+        while True:
+            params = {"limit": 200} if before is None else {"limit": 200, "before": before}
+            page = (await client.get(f"/chats/{chat['id']}/messages", params=params, headers=headers)).json()
+            matches.extend(
+                message["id"] for message in page if all(term in message["content"].lower() for term in terms)
+            )
+            if len(page) < 200:
+                break
+            before = page[0]["id"]
+    return matches
+
+
+async def search(args) -> int:
+    """Latency of finding messages by content, through GET /search/messages or by scanning history client-side."""
+    import httpx
+
+    sample = await _sample(args.users)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    with Server(args.database_url, args.app_dir, args.db_latency_ms) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=300) as client:
+            tutors = sorted({chat.tutor_id for chat in sample["chats"]})
+            headers = {user_id: await _auth_headers(client, sample["users"][user_id]) for user_id in tutors}
+
+            def request():
+                user_id = rng.choice(tutors)
+                terms = args.query.lower().split() if args.query else rng.sample(WORDS, args.terms)
+                if args.mode == "index":
+                    return "GET /search/messages", lambda: client.get(
+                        "/search/messages", params={"q": " ".join(terms)}, headers=headers[user_id]
+                    )
+
+                async def scan():
+                    await _search_client_side(client, user_id, headers[user_id], terms)
+                    return httpx.Response(200)
+
+                return "client-side scan", scan
+
+            report = await _drive(args.concurrency, args.duration, request)
+
+    print(f"{args.app_dir}: {repr(args.query) if args.query else f'{args.terms}-word'} queries, concurrency {args.concurrency}, db latency {args.db_latency_ms} ms")
+    _print_report(report)
+    return 0
+
+
+async def login(args) -> int:
+    """Concurrent POST /login, with a probe timing GET /health while bcrypt runs."""
+    import httpx
+
+    sample = await _sample(args.users)
+    if not sample["users"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    usernames = sorted(sample["users"].values())
+    recorder = Recorder()
+    with Server(args.database_url, args.app_dir, args.db_latency_ms, hash_inline=args.hash_inline) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=120) as client:
+            async def worker(deadline: float) -> None:
+                while time.perf_counter() < deadline:
+                    form = {"username": rng.choice(usernames), "password": BENCH_PASSWORD}
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post("/login", data=form)
+                    except httpx.HTTPError:
+                        recorder.record("POST /login", time.perf_counter() - start, False)
+                        continue
+                    if response.status_code == 503:
+                        # Shed by the hashing pool; back off as a client should
+                        recorder.record("POST /login (503)", time.perf_counter() - start, True)
+                        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                        continue
+                    recorder.record("POST /login", time.perf_counter() - start, response.status_code < 400)
+
+            async def probe(deadline: float) -> None:
+                # What every other request on the worker sees meanwhile
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        ok = (await client.get("/health")).status_code < 400
+                    except httpx.HTTPError:
+                        ok = False
+                    recorder.record("GET /health (probe)", time.perf_counter() - start, ok)
+                    await asyncio.sleep(args.probe_interval)
+
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(probe(deadline), *(worker(deadline) for _ in range(args.concurrency)))
+            report = summarize(recorder, time.perf_counter() - start)
+
+    hashing = "inline" if args.hash_inline else "hashing pool"
+    print(f"{args.app_dir}: {hashing}, concurrency {args.concurrency}, db latency {args.db_latency_ms} ms")
+    _print_report(report)
+    return 0
+
+
+async def cpu(args) -> int:
+    """Server CPU time per request for one endpoint, from /proc, with requests sent one at a time."""
+    import httpx
+
+    sample = await _sample(args.chats)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    with Server(args.database_url, args.app_dir, args.db_latency_ms) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=120) as client:
+            chats = sample["chats"]
+            headers = {chat.tutor_id: await _auth_headers(client, sample["users"][chat.tutor_id]) for chat in chats}
+
+            async def request() -> int:
+                chat = rng.choice(chats)
+                response = await client.get(
+                    args.path.format(chat_id=chat.id, user_id=chat.tutor_id),
+                    headers={**headers[chat.tutor_id], "Accept-Encoding": args.accept_encoding},
+                )
+                response.raise_for_status()
+                return response.num_bytes_downloaded
+
+            # Warm-up covers lazy imports and first-hit caches
+            for _ in range(args.warmup):
+                await request()
+            cpu_start, start = server.cpu_seconds(), time.perf_counter()
+            sizes = [await request() for _ in range(args.requests)]
+            cpu_used, elapsed = server.cpu_seconds() - cpu_start, time.perf_counter() - start
+
+    print(f"{args.app_dir} GET {args.path} (Accept-Encoding: {args.accept_encoding}), {args.requests} requests")
+    print(f"server CPU {cpu_used / args.requests * 1000:.2f} ms/request, "
+          f"wall {elapsed / args.requests * 1000:.2f} ms/request, "
+          f"{sum(sizes) / len(sizes) / 1024:.1f} KiB on the wire")
+    return 0
+
+
+async def stream(args) -> int:
+    """Time to first byte and peak server RSS for one large listing, buffered or streamed."""
+    import httpx
+
+    params = {"stream": "true"} if args.mode != "buffered" else {}
+    # Identity encoding keeps compression, which older checkouts lack, out of the figures
+    headers = {"Accept-Encoding": "identity"}
+    if args.mode == "ndjson":
+        headers["Accept"] = "application/x-ndjson"
+
+    with Server(args.database_url, args.app_dir, args.db_latency_ms) as server:
+        idle_mb = server.memory_mb()
+        print(f"{args.app_dir} GET {args.path} ({args.mode})")
+        print(f"{'request':>8}{'ttfb ms':>10}{'total ms':>10}{'MB':>8}")
+        async with httpx.AsyncClient(base_url=server.url, timeout=300) as client:
+            for i in range(1, args.requests + 1):
+                start = time.perf_counter()
+                first_byte: Optional[float] = None
+                size = 0
+                async with client.stream("GET", args.path, params=params, headers=headers) as response:
+                    async for chunk in response.aiter_raw():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        size += len(chunk)
+                total = time.perf_counter() - start
+                print(f"{i:>8}{(first_byte or total) * 1000:>10.1f}{total * 1000:>10.1f}{size / 2**20:>8.1f}")
+        peak_mb = server.memory_mb("VmHWM")
+
+    print(f"server RSS idle {idle_mb:.1f} MB, peak {peak_mb:.1f} MB (+{peak_mb - idle_mb:.1f} MB)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("LOADTEST_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--seed", type=int, default=1234, help="RNG seed for the request mix")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def benchmark(name: str, help: str) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help=help)
+        command.add_argument("--app-dir", default=HERE, help="checkout to serve (default: this one)")
+        command.add_argument("--db-latency-ms", type=float, default=0, help="delay added to every SQL statement")
+        return command
+
+    serve_parser = benchmark("serve", "serve a checkout for a benchmark run (internal)")
+    serve_parser.add_argument("--port", type=int, required=True)
+    serve_parser.add_argument("--hash-inline", action="store_true")
+
+    throughput_parser = benchmark("throughput", "concurrent reads of chat history")
+    throughput_parser.add_argument("--concurrency", type=int, default=50)
+    throughput_parser.add_argument("--duration", type=float, default=15)
+    throughput_parser.add_argument("--chats", type=int, default=20, help="chats to draw requests from; their tutors log in")
+
+    batch_parser = benchmark("batch", "message ingestion, one per request or batched")
+    batch_parser.add_argument("--messages", type=int, default=2000)
+    batch_parser.add_argument("--batch-size", type=int, help="messages per POST /messages/batch (default: single sends)")
+    batch_parser.add_argument("--concurrency", type=int, default=10)
+    batch_parser.add_argument("--chats", type=int, default=20, help="chats to post into; their tutors log in")
+
+    search_parser = benchmark("search", "message search through the index or a client-side scan")
+    search_parser.add_argument("--mode", choices=("index", "client"), default="index")
+    search_parser.add_argument("--terms", type=int, default=1, help="words per query")
+    search_parser.add_argument("--query", help="fixed query instead of random corpus words, e.g. a term no message contains")
+    search_parser.add_argument("--concurrency", type=int, default=5)
+    search_parser.add_argument("--duration", type=float, default=20)
+    search_parser.add_argument("--users", type=int, default=20, help="chats whose tutors run the searches")
+
+    login_parser = benchmark("login", "login throughput and event loop latency while bcrypt runs")
+    login_parser.add_argument("--hash-inline", action="store_true", help="run bcrypt on the event loop, not the hashing pool")
+    login_parser.add_argument("--concurrency", type=int, default=20)
+    login_parser.add_argument("--duration", type=float, default=20)
+    login_parser.add_argument("--probe-interval", type=float, default=0.1, help="seconds between GET /health probes")
+    login_parser.add_argument("--users", type=int, default=50, help="chats whose members log in")
+
+    cpu_parser = benchmark("cpu", "server CPU time per request")
+    cpu_parser.add_argument("--path", default="/chats/{chat_id}/messages?limit=200",
+                            help="{chat_id} and {user_id} are filled from the sampled chats")
+    cpu_parser.add_argument("--accept-encoding", default="identity")
+    cpu_parser.add_argument("--requests", type=int, default=500)
+    cpu_parser.add_argument("--warmup", type=int, default=20)
+    cpu_parser.add_argument("--chats", type=int, default=20, help="chats to draw requests from; their tutors log in")
+
+    stream_parser = benchmark("stream", "time to first byte and peak RSS of a large listing")
+    stream_parser.add_argument("--path", default="/users")
+    stream_parser.add_argument("--mode", choices=("buffered", "json", "ndjson"), default="buffered")
+    stream_parser.add_argument("--requests", type=int, default=3, help="sequential requests; peak RSS covers them all")
+
+    args = parser.parse_args()
+    if args.database_url.split(":", 1)[0] != "sqlite":
+        parser.error("benchmarks run against a SQLite database")
+    if args.command == "serve":
+        serve(args)
+        return 0
+
+    _configure_database(args.database_url)
+    os.environ["JWT_SECRET_KEY"] = BENCH_JWT_SECRET
+    benchmarks = {
+        "throughput": throughput, "batch": batch, "cpu": cpu, "login": login, "search": search, "stream": stream,
+    }
+    return asyncio.run(_run(benchmarks[args.command], args))
+
+
+async def _run(benchmark, args) -> int:
+    from database import get_engine
+
+    try:
+        return await benchmark(args)
+    finally:
+        await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
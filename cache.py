@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Course, User
+from responses import dumps
+
+CATALOG_TTL = 300  # seconds; courses and the tutor roster change rarely
+LOOKUP_CACHE_SIZE = 1024  # per-name entries kept before evicting the least recently used
+
+
+class CachedResponse:
+    """A JSON body serialized once, with its ETag."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+    @classmethod
+    def from_content(cls, content: Any) -> "CachedResponse":
+        return cls(dumps(content))
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+# Whole-table listings (/courses, /tutors)
+catalog_cache = TTLCache(ttl=CATALOG_TTL, maxsize=16)
+# Per-name lookups (/tutors/{name}, /courses/{course_name}/tutors)
+lookup_cache = TTLCache(ttl=CATALOG_TTL, maxsize=LOOKUP_CACHE_SIZE)
+
+
+_invalidation_hooks: List[Callable[[], None]] = []
+
+
+def on_catalog_invalidated(hook: Callable[[], None]) -> Callable[[], None]:
+    """Register `hook` to run whenever catalog data (users, courses) changes."""
+    _invalidation_hooks.append(hook)
+    return hook
+
+
+def invalidate_catalog() -> None:
+    catalog_cache.clear()
+    lookup_cache.clear()
+    for hook in _invalidation_hooks:
+        hook()
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"catalog": catalog_cache.stats(), "lookup": lookup_cache.stats()}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def cached_json(request: Request, cache: TTLCache, key: Hashable, loader: Callable) -> Response:
+    """
+    Read-through helper: serve `key` from `cache`, calling `await loader()` on a miss.
+
+    Answers 304 when the client's If-None-Match already has the current body.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        entry = CachedResponse.from_content(await loader())
+        cache.set(key, entry)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Invalidate once a transaction touching users or courses commits
+_CATALOG_MODELS = (Course, User)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _CATALOG_MODELS):
+            session.info["catalog_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("catalog_dirty", False):
+        invalidate_catalog()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop("catalog_dirty", None)
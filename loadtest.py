@@ -0,0 +1,431 @@
+"""
+Seeded load test for the HiveMind API.
+
+Seeds a database with a reproducible synthetic dataset, drives every main
+endpoint with concurrent clients and reports p50/p95/p99 latency and
+throughput per route. Results can be saved as a baseline and later runs
+compared against it, exiting non-zero when a route regresses.
+
+    pip install -r requirements-dev.txt
+    python loadtest.py seed --users 5000 --courses 1000 --messages 1000000
+    python loadtest.py run --save-baseline
+    python loadtest.py run --compare          # exits 1 on regression
+    python loadtest.py fanout --subscribers 500
+
+By default everything runs against a local SQLite file and the app is served
+in-process over ASGI. Pass --database-url to use a Postgres stand-in and
+--url to drive an already running server (which must use the same database).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+DEFAULT_DATABASE_URL = "sqlite:///loadtest.db"
+DEFAULT_BASELINE = "loadtest_baseline.json"
+BENCH_PASSWORD = "loadtest-password"
+INSERT_BATCH_SIZE = 5000
+
+WORDS = (
+    "calculus exam homework derivative integral matrix vector proof lemma essay chapter "
+    "lecture deadline tomorrow question answer explain example practice quiz review session "
+    "thanks please help confused stuck understand formula graph chemistry physics biology"
+).split()
+
+
+def _configure_database(url: str) -> None:
+    # database.py reads these at import time
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("DB_POOL_MODE", "queue")
+    # The in-process app only needs tokens to verify within this run
+    os.environ.setdefault("JWT_ALLOW_RANDOM_SECRET", "true")
+    os.environ.setdefault("SLOW_QUERY_MS", "1000")
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+
+
+async def seed(args) -> None:
+    from sqlalchemy import insert, text
+
+    from database import Base, get_engine
+    from models import Chat, Course, Message, User
+    from security import bcrypt_hash
+
+    rng = random.Random(args.seed)
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    # One hash shared by every user keeps seeding fast; logins still pay full bcrypt cost
+    password_hash = bcrypt_hash(BENCH_PASSWORD)
+    tutor_count = max(1, args.users // 5)
+
+    async def insert_rows(model, rows):
+        async with engine.begin() as conn:
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                await conn.execute(insert(model), rows[start:start + INSERT_BATCH_SIZE])
+
+    await insert_rows(Course, [
+        {"id": i, "name": f"Course {i:05d}", "description": _sentence(rng)} for i in range(1, args.courses + 1)
+    ])
+    # Core inserts are keyed by column key; isTutor maps to the "istutor" column
+    is_tutor_key = User.__table__.c.istutor.key
+    await insert_rows(User, [
+        {
+            "id": i,
+            "username": f"user{i:06d}",
+            "email": f"user{i:06d}@example.com",
+            "password": password_hash,
+            is_tutor_key: i <= tutor_count,
+            "course_id": rng.randint(1, args.courses) if args.courses else None,
+        }
+        for i in range(1, args.users + 1)
+    ])
+
+    students = range(tutor_count + 1, args.users + 1)
+    pairs = set()
+    while students and len(pairs) < args.chats:
+        pairs.add((rng.randint(1, tutor_count), rng.choice(students)))
+    chats = [{"id": i, "tutor_id": t, "student_id": s} for i, (t, s) in enumerate(sorted(pairs), start=1)]
+    await insert_rows(Chat, chats)
+
+    # Messages go in chunks so millions of rows never sit in memory at once
+    written = 0
+    while written < args.messages and chats:
+        count = min(INSERT_BATCH_SIZE * 10, args.messages - written)
+        rows = []
+        for _ in range(count):
+            chat = rng.choice(chats)
+            rows.append({
+                "chat_id": chat["id"],
+                "sender_id": rng.choice((chat["tutor_id"], chat["student_id"])),
+                "content": _sentence(rng),
+            })
+        await insert_rows(Message, rows)
+        written += count
+        print(f"seeded {written}/{args.messages} messages", file=sys.stderr)
+
+    if engine.dialect.name == "postgresql":
+        # Rows went in with explicit ids; move the sequences past them so the
+        # app's own inserts don't collide
+        async with engine.begin() as conn:
+            for table in ("courses", "users", "chats"):
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}"
+                ))
+
+    await engine.dispose()
+    print(f"Seeded {args.courses} courses, {args.users} users ({tutor_count} tutors), "
+          f"{len(chats)} chats, {written} messages")
+
+
+async def _sample(limit: int) -> Dict[str, list]:
+    """Pull ids and names from the seeded data for the clients to request."""
+    from sqlalchemy import select
+
+    from database import SessionLocal
+    from models import Chat, Course, User
+
+    async with SessionLocal() as db:
+        chats = (await db.execute(
+            select(Chat.id, Chat.tutor_id, Chat.student_id).order_by(Chat.id).limit(limit)
+        )).all()
+        user_ids = {user_id for chat in chats for user_id in (chat.tutor_id, chat.student_id)}
+        users = dict((await db.execute(select(User.id, User.username).filter(User.id.in_(user_ids)))).all())
+        tutors = (await db.execute(select(User.username).filter(User.isTutor == True).limit(limit))).scalars().all()
+        courses = (await db.execute(select(Course.name).limit(limit))).scalars().all()
+    return {"chats": chats, "users": users, "tutors": tutors, "courses": courses}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        self.latencies[route].append(seconds)
+        if not ok:
+            self.errors[route] += 1
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for route, values in sorted(recorder.latencies.items()):
+        report[route] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 95) * 1000, 2),
+            "p99_ms": round(_percentile(values, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 2),
+        }
+    return report
+
+
+async def run(args) -> int:
+    from database import get_engine
+
+    try:
+        return await _drive(args)
+    finally:
+        # Pooled connections otherwise keep the process alive at exit
+        await get_engine().dispose()
+
+
+async def _drive(args) -> int:
+    import httpx
+
+    sample = await _sample(args.sample)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        from main import app
+
+        transport, base_url = httpx.ASGITransport(app=app), "http://loadtest"
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    tokens: Dict[int, str] = {}
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30) as client:
+
+        async def call(route: str, method: str, path: str, user_id: Optional[int] = None, **kwargs) -> Optional[httpx.Response]:
+            headers = {"Authorization": f"Bearer {tokens[user_id]}"} if user_id else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers, **kwargs)
+            except httpx.HTTPError:
+                recorder.record(route, time.perf_counter() - start, False)
+                return None
+            recorder.record(route, time.perf_counter() - start, response.status_code < 400)
+            return response
+
+        async def login(user_id: int) -> None:
+            response = await call("POST /login", "POST", "/login", data={
+                "username": sample["users"][user_id], "password": BENCH_PASSWORD,
+            })
+            if response is not None and response.status_code == 200:
+                tokens[user_id] = response.json()["access_token"]
+
+        # Every sampled user logs in once; those logins are the login benchmark
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded_login(user_id: int) -> None:
+            async with semaphore:
+                await login(user_id)
+
+        await asyncio.gather(*(bounded_login(user_id) for user_id in sample["users"]))
+        chats = [chat for chat in sample["chats"] if chat.tutor_id in tokens and chat.student_id in tokens]
+        if not chats:
+            print("Logins failed; nothing to drive", file=sys.stderr)
+            return 2
+
+        def scenarios():
+            chat = rng.choice(chats)
+            member = rng.choice((chat.tutor_id, chat.student_id))
+            options = [
+                lambda: call("GET /chats/{user_id}", "GET", f"/chats/{member}", member),
+                lambda: call("GET /chats/{chat_id}/messages", "GET", f"/chats/{chat.id}/messages", member),
+                lambda: call("POST /messages/", "POST", "/messages/", member,
+                             json={"chat_id": chat.id, "content": _sentence(rng)}),
+                lambda: call("GET /search/messages", "GET", "/search/messages", member,
+                             params={"q": rng.choice(WORDS)}),
+                lambda: call("GET /tutors", "GET", "/tutors"),
+                lambda: call("GET /courses", "GET", "/courses"),
+            ]
+            # Routes that need a sampled name only run when the dataset has one
+            if sample["tutors"]:
+                options.append(lambda: call("GET /tutors/{name}", "GET", f"/tutors/{rng.choice(sample['tutors'])}"))
+            if sample["courses"]:
+                options.append(lambda: call("GET /courses/{course_name}/tutors", "GET",
+                                            f"/courses/{rng.choice(sample['courses'])}/tutors"))
+            return rng.choice(options)
+
+        async def worker(deadline: float) -> None:
+            while time.perf_counter() < deadline:
+                await scenarios()()
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(worker(deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    report = summarize(recorder, elapsed)
+    login_stats = report.get("POST /login")
+    if login_stats:
+        # Logins ran in the warm-up phase, not for the timed duration
+        login_stats["rps"] = None
+    _print_report(report)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    if args.compare:
+        return compare(report, args.baseline, args.threshold)
+    return 0
+
+
+async def fanout(args) -> int:
+    from database import get_engine
+
+    try:
+        return await _fanout(args)
+    finally:
+        await get_engine().dispose()
+
+
+async def _fanout(args) -> int:
+    """
+    Fan-out latency: --subscribers listeners on one chat while its tutor posts
+    --messages messages through the API, timing each delivery from the moment
+    its POST was sent.
+
+    The ASGI transport carries no websockets, so listeners subscribe to the
+    hub directly, as the /ws/chats/{chat_id} route does; the socket send
+    itself is not included.
+    """
+    import httpx
+
+    from main import app
+    from realtime import OVERFLOW, get_hub
+
+    sample = await _sample(1)
+    if not sample["chats"]:
+        print("No seeded data found; run `python loadtest.py seed` first", file=sys.stderr)
+        return 2
+    chat = sample["chats"][0]
+
+    recorder = Recorder()
+    sent: Dict[str, float] = {}
+    hub = get_hub()
+
+    async def listen(subscribed: asyncio.Event) -> None:
+        async with hub.subscribe(chat.id) as queue:
+            subscribed.set()
+            for _ in range(args.messages):
+                event = await queue.get()
+                if event is OVERFLOW:
+                    recorder.record("delivery", 0, False)
+                    return
+                recorder.record("delivery", time.perf_counter() - sent[event["message"]["content"]], True)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=30) as client:
+        response = await client.post("/login", data={"username": sample["users"][chat.tutor_id], "password": BENCH_PASSWORD})
+        if response.status_code != 200:
+            print("Login failed; nothing to drive", file=sys.stderr)
+            return 2
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        ready = [asyncio.Event() for _ in range(args.subscribers)]
+        listeners = [asyncio.create_task(listen(subscribed)) for subscribed in ready]
+        await asyncio.gather(*(subscribed.wait() for subscribed in ready))
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            content = f"fanout {i}"
+            sent[content] = time.perf_counter()
+            response = await client.post("/messages/", json={"chat_id": chat.id, "content": content}, headers=headers)
+            recorder.record("POST /messages/", time.perf_counter() - sent[content], response.status_code < 400)
+            if args.interval:
+                await asyncio.sleep(args.interval)
+        await asyncio.wait(listeners, timeout=30)
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.subscribers} subscribers, {args.messages} messages")
+    _print_report(summarize(recorder, elapsed))
+    return 0
+
+
+def _print_report(report: Dict[str, Dict[str, float]]) -> None:
+    header = f"{'route':<36}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, stats in report.items():
+        rps = "-" if stats["rps"] is None else f"{stats['rps']:.1f}"
+        print(f"{route:<36}{stats['requests']:>8}{stats['errors']:>6}{rps:>9}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+
+
+def compare(report: Dict[str, Dict[str, float]], baseline_path: str, threshold: float) -> int:
+    """Fail when any route's p95 grew more than `threshold` over the baseline."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for route, stats in report.items():
+        before = baseline.get(route)
+        if not before:
+            continue
+        limit = before["p95_ms"] * (1 + threshold)
+        if stats["p95_ms"] > limit:
+            regressions.append(f"{route}: p95 {stats['p95_ms']:.1f} ms > {limit:.1f} ms (baseline {before['p95_ms']:.1f} ms)")
+        if stats["errors"] > before.get("errors", 0):
+            regressions.append(f"{route}: {stats['errors']} errors (baseline {before.get('errors', 0)})")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No route regressed more than {threshold:.0%} against {baseline_path}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("LOADTEST_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--seed", type=int, default=1234, help="RNG seed for data and request mix")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="drop, recreate and populate the database")
+    seed_parser.add_argument("--users", type=int, default=5000)
+    seed_parser.add_argument("--courses", type=int, default=1000)
+    seed_parser.add_argument("--chats", type=int, default=20000)
+    seed_parser.add_argument("--messages", type=int, default=1_000_000)
+
+    run_parser = commands.add_parser("run", help="drive the API and report latency")
+    run_parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds to drive traffic")
+    run_parser.add_argument("--sample", type=int, default=200, help="chats/tutors/courses to draw requests from")
+    run_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    run_parser.add_argument("--save-baseline", action="store_true")
+    run_parser.add_argument("--compare", action="store_true")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 growth before failing")
+
+    fanout_parser = commands.add_parser("fanout", help="time message delivery to many subscribers of one chat")
+    fanout_parser.add_argument("--subscribers", type=int, default=500)
+    fanout_parser.add_argument("--messages", type=int, default=200)
+    fanout_parser.add_argument("--interval", type=float, default=0, help="seconds between messages")
+
+    args = parser.parse_args()
+    _configure_database(args.database_url)
+    if args.command == "seed":
+        asyncio.run(seed(args))
+        return 0
+    if args.command == "fanout":
+        return asyncio.run(fanout(args))
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
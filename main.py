@@ -1,11 +1,72 @@
+from startup import WARMUP_ON_STARTUP, mark_app_ready, report as startup_report, timed_import, warm_up
+
+# Dependencies first, so each app module's figure is only its own cost
+for module in ("fastapi", "pydantic", "sqlalchemy", "schema", "models", "database", "routes"):
+    timed_import(module)
+
 from routes import router
+from cache import cache_stats
+from database import pool_status
+from metrics import RequestStats, current_request, registry, render_prometheus, server_timing
+from responses import COMPRESSION_MIN_SIZE, FastJSONResponse
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+import asyncio
+import os
+import time
+
+# Opt-in: long-lived workers can run archival and partition upkeep
+# themselves; serverless deployments run `python archive.py` from cron instead
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+
+try:
+    # Brotli when available, falling back to gzip for clients that lack it
+    from brotli_asgi import BrotliMiddleware as CompressionMiddleware
+    COMPRESSION_OPTIONS = {"minimum_size": COMPRESSION_MIN_SIZE, "gzip_fallback": True}
+except ImportError:
+    from fastapi.middleware.gzip import GZipMiddleware as CompressionMiddleware
+    COMPRESSION_OPTIONS = {"minimum_size": COMPRESSION_MIN_SIZE}
 
-from fastapi import FastAPI
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Opt-in: pay the first connection's TLS handshake before traffic arrives
+    if WARMUP_ON_STARTUP:
+        await warm_up()
 
-app = FastAPI()
+    archiver = None
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        from archive import run_periodically
+
+        archiver = asyncio.create_task(run_periodically(ARCHIVE_INTERVAL_SECONDS))
+    yield
+    if archiver is not None:
+        archiver.cancel()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Include routes
 app.include_router(router)
+app.add_middleware(CompressionMiddleware, **COMPRESSION_OPTIONS)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    stats = RequestStats()
+    token = current_request.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_request.reset(token)
+    duration = time.perf_counter() - start
+
+    # Label by route template, not raw path, to keep cardinality bounded
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    registry.record_request(request.method, route_path, response.status_code, duration, stats)
+    response.headers["Server-Timing"] = server_timing(duration, stats)
+    return response
 
 @app.get("/")
 def root():
@@ -13,7 +74,15 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "OK"}
-
+    return {
+        "status": "OK",
+        "db_pool": pool_status(),
+        "cache": cache_stats(),
+        "startup": startup_report.as_dict(),
+    }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_prometheus(pool_status(), cache_stats())
 
+mark_app_ready()
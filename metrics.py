@@ -0,0 +1,182 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("uvicorn.error")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    """Database work attributed to the request currently being served."""
+
+    __slots__ = ("statements", "db_time", "pool_wait")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+
+
+# Holds a mutable RequestStats so engine events running in SQLAlchemy's
+# greenlet (which shares the task's context) can add to it
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.responses: Dict[int, int] = {}
+        self.db_statements = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.statements = 0
+        self.db_time = 0.0
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, method: str, route: str, status_code: int, duration: float, stats: RequestStats) -> None:
+        with self._lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(duration)
+            metrics.responses[status_code] = metrics.responses.get(status_code, 0) + 1
+            metrics.db_statements += stats.statements
+            metrics.db_time += stats.db_time
+            metrics.pool_wait += stats.pool_wait
+
+    def record_statement(self, duration: float, slow: bool) -> None:
+        with self._lock:
+            self.statements += 1
+            self.db_time += duration
+            if slow:
+                self.slow_queries += 1
+
+
+registry = MetricsRegistry()
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = current_request.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    slow = duration * 1000 >= SLOW_QUERY_MS
+    if slow:
+        logger.warning(f"Slow query ({duration * 1000:.1f} ms): {' '.join(statement.split())[:1000]}")
+
+    registry.record_statement(duration, slow)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += duration
+
+
+def server_timing(duration: float, stats: RequestStats) -> str:
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} queries", '
+        f"pool;dur={stats.pool_wait * 1000:.1f}, "
+        f"total;dur={duration * 1000:.1f}"
+    )
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(pool: Dict, cache: Dict) -> str:
+    """Prometheus text exposition of everything recorded so far."""
+    lines: List[str] = [
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    with registry._lock:
+        routes = sorted(registry.routes.items())
+        for (method, route), metrics in routes:
+            cumulative = 0
+            for bound, count in zip((*metrics.latency.buckets, "+Inf"), metrics.latency.counts):
+                cumulative += count
+                lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {metrics.latency.sum}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {metrics.latency.count}")
+
+        lines.append("# TYPE http_responses_total counter")
+        for (method, route), metrics in routes:
+            for status_code, count in sorted(metrics.responses.items()):
+                lines.append(f"http_responses_total{_labels(method=method, route=route, status=status_code)} {count}")
+
+        lines.append("# TYPE http_request_db_statements_total counter")
+        for (method, route), metrics in routes:
+            lines.append(f"http_request_db_statements_total{_labels(method=method, route=route)} {metrics.db_statements}")
+        lines.append("# TYPE http_request_db_seconds_total counter")
+        for (method, route), metrics in routes:
+            lines.append(f"http_request_db_seconds_total{_labels(method=method, route=route)} {metrics.db_time}")
+        lines.append("# TYPE http_request_pool_wait_seconds_total counter")
+        for (method, route), metrics in routes:
+            lines.append(f"http_request_pool_wait_seconds_total{_labels(method=method, route=route)} {metrics.pool_wait}")
+
+        lines += [
+            "# TYPE db_statements_total counter",
+            f"db_statements_total {registry.statements}",
+            "# TYPE db_statement_seconds_total counter",
+            f"db_statement_seconds_total {registry.db_time}",
+            "# TYPE db_slow_queries_total counter",
+            f"db_slow_queries_total {registry.slow_queries}",
+        ]
+
+    if "checked_out" in pool:
+        lines += [
+            "# TYPE db_pool_checked_out gauge",
+            f"db_pool_checked_out {pool['checked_out']}",
+            "# TYPE db_pool_overflow gauge",
+            f"db_pool_overflow {pool['overflow']}",
+            "# TYPE db_pool_wait_seconds_total counter",
+            f"db_pool_wait_seconds_total {pool['wait']['total_ms'] / 1000}",
+            "# TYPE db_pool_waits_total counter",
+            f"db_pool_waits_total {pool['wait']['count']}",
+        ]
+
+    lines.append("# TYPE cache_hits_total counter")
+    lines += [f"cache_hits_total{_labels(cache=name)} {stats['hits']}" for name, stats in cache.items()]
+    lines.append("# TYPE cache_misses_total counter")
+    lines += [f"cache_misses_total{_labels(cache=name)} {stats['misses']}" for name, stats in cache.items()]
+    return "\n".join(lines) + "\n"
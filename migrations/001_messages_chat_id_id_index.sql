@@ -0,0 +1,12 @@
+-- Composite index behind keyset pagination of a chat's messages
+-- (GET /chats/{chat_id}/messages?before=/after=) and the inbox's
+-- last-message lookup.
+--
+-- The app never runs create_all against the deployed database; apply the
+-- files in this directory in order. Each one is idempotent:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/001_messages_chat_id_id_index.sql
+--
+-- Building the index blocks writes to messages until it finishes.
+
+CREATE INDEX IF NOT EXISTS ix_messages_chat_id_id ON messages (chat_id, id);
@@ -0,0 +1,14 @@
+-- Per-user read positions behind unread counts on GET /chats/{user_id} and
+-- POST /chats/{chat_id}/read. Idempotent:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/002_chat_read_cursors.sql
+
+CREATE TABLE IF NOT EXISTS chat_read_cursors (
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    last_read_message_id INTEGER NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (user_id, chat_id),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
+);
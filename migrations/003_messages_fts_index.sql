@@ -0,0 +1,9 @@
+-- GIN index behind GET /search/messages. The expression must match
+-- search.py's to_tsvector('english', content) exactly for the planner to
+-- use it. Idempotent:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/003_messages_fts_index.sql
+--
+-- Building the index blocks writes to messages until it finishes.
+
+CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages USING gin (to_tsvector('english', content));
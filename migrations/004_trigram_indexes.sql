@@ -0,0 +1,9 @@
+-- pg_trgm and the trigram indexes behind GET /tutors/search (prefix ILIKE
+-- and fuzzy % matching on usernames and course names). Idempotent:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/004_trigram_indexes.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_courses_name_trgm ON courses USING gin (name gin_trgm_ops);
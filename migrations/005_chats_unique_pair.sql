@@ -0,0 +1,53 @@
+-- One chat per (tutor, student) pair, required by the
+-- INSERT ... ON CONFLICT (tutor_id, student_id) in POST /chats/.
+--
+-- Chats created twice by the old check-then-insert race are merged into the
+-- oldest chat of their pair first: messages and read cursors move over, then
+-- the duplicates are deleted and the constraint is added. Idempotent; run
+-- after 002_chat_read_cursors.sql:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/005_chats_unique_pair.sql
+
+BEGIN;
+
+-- Hold off chat creation so no new duplicate appears mid-merge
+LOCK TABLE chats IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TEMPORARY TABLE chat_duplicates ON COMMIT DROP AS
+SELECT id AS duplicate_id, keep_id
+FROM (
+    SELECT id, min(id) OVER (PARTITION BY tutor_id, student_id) AS keep_id
+    FROM chats
+    WHERE tutor_id IS NOT NULL AND student_id IS NOT NULL
+) pairs
+WHERE id <> keep_id;
+
+UPDATE messages
+SET chat_id = chat_duplicates.keep_id
+FROM chat_duplicates
+WHERE messages.chat_id = chat_duplicates.duplicate_id;
+
+-- A user's cursor on the kept chat becomes the furthest of their cursors
+INSERT INTO chat_read_cursors (user_id, chat_id, last_read_message_id, updated_at)
+SELECT cursors.user_id, chat_duplicates.keep_id, max(cursors.last_read_message_id), max(cursors.updated_at)
+FROM chat_read_cursors cursors
+JOIN chat_duplicates ON cursors.chat_id = chat_duplicates.duplicate_id
+GROUP BY cursors.user_id, chat_duplicates.keep_id
+ON CONFLICT (user_id, chat_id) DO UPDATE
+SET last_read_message_id = greatest(chat_read_cursors.last_read_message_id, excluded.last_read_message_id),
+    updated_at = greatest(chat_read_cursors.updated_at, excluded.updated_at);
+
+-- Cursors still pointing at duplicates go with them (ON DELETE CASCADE)
+DELETE FROM chats
+USING chat_duplicates
+WHERE chats.id = chat_duplicates.duplicate_id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_chats_tutor_student') THEN
+        ALTER TABLE chats ADD CONSTRAINT uq_chats_tutor_student UNIQUE (tutor_id, student_id);
+    END IF;
+END
+$$;
+
+COMMIT;
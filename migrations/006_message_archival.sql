@@ -0,0 +1,93 @@
+-- Message archival (archive.py): chats.archived_through_id, the
+-- message_archives table, and messages converted to a table partitioned by
+-- id range. Idempotent:
+--
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/006_message_archival.sql
+--
+-- The conversion copies every message into the new partitioned table while
+-- holding an exclusive lock on messages, so run it in a maintenance window.
+-- Partitions hold 1,000,000 ids each, matching MESSAGE_PARTITION_SIZE in
+-- models.py. Afterwards keep partitions ahead of new ids with
+-- `python archive.py partitions` from cron (or ARCHIVE_INTERVAL_SECONDS).
+
+BEGIN;
+
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS archived_through_id INTEGER;
+
+CREATE TABLE IF NOT EXISTS message_archives (
+    id SERIAL PRIMARY KEY,
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    first_message_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    last_sender_id INTEGER,
+    last_timestamp TIMESTAMP WITHOUT TIME ZONE,
+    last_content TEXT,
+    payload BYTEA NOT NULL,
+    archived_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_message_archives_chat_id_last_message_id
+    ON message_archives (chat_id, last_message_id);
+
+DO $$
+DECLARE
+    partition_size CONSTANT bigint := 1000000;
+    partitions_ahead CONSTANT integer := 3;
+    partition_key text;
+    id_sequence text;
+    first_block bigint;
+    last_block bigint;
+BEGIN
+    SELECT pg_get_partkeydef(partrelid) INTO partition_key
+    FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass;
+    IF partition_key = 'RANGE (id)' THEN
+        RETURN;  -- Already converted
+    ELSIF partition_key IS NOT NULL THEN
+        RAISE EXCEPTION 'messages is partitioned by %, expected RANGE (id)', partition_key;
+    END IF;
+
+    LOCK TABLE messages IN ACCESS EXCLUSIVE MODE;
+
+    -- Index names are schema-wide, so free them up for the new table
+    ALTER TABLE messages RENAME TO messages_unpartitioned;
+    ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_unpartitioned_pkey;
+    ALTER INDEX IF EXISTS ix_messages_id RENAME TO ix_messages_unpartitioned_id;
+    ALTER INDEX IF EXISTS ix_messages_chat_id_id RENAME TO ix_messages_unpartitioned_chat_id_id;
+    ALTER INDEX IF EXISTS ix_messages_content_fts RENAME TO ix_messages_unpartitioned_content_fts;
+
+    id_sequence := pg_get_serial_sequence('messages_unpartitioned', 'id');
+    EXECUTE format(
+        'CREATE TABLE messages ('
+        '    id INTEGER NOT NULL DEFAULT nextval(%L::regclass),'
+        '    chat_id INTEGER REFERENCES chats (id) ON DELETE CASCADE,'
+        '    sender_id INTEGER REFERENCES users (id),'
+        '    content TEXT NOT NULL,'
+        '    timestamp TIMESTAMP WITHOUT TIME ZONE,'
+        '    PRIMARY KEY (id)'
+        ') PARTITION BY RANGE (id)',
+        id_sequence
+    );
+    -- Keep the sequence when the old table is dropped
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY messages.id', id_sequence);
+
+    CREATE INDEX ix_messages_id ON messages (id);
+    CREATE INDEX ix_messages_chat_id_id ON messages (chat_id, id);
+    CREATE INDEX ix_messages_content_fts ON messages USING gin (to_tsvector('english', content));
+
+    SELECT coalesce(min(id), 0) / partition_size, coalesce(max(id), 0) / partition_size + partitions_ahead
+    INTO first_block, last_block
+    FROM messages_unpartitioned;
+    FOR block IN first_block..last_block LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%s) TO (%s)',
+            'messages_p' || block, block * partition_size, (block + 1) * partition_size
+        );
+    END LOOP;
+    CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+    INSERT INTO messages (id, chat_id, sender_id, content, timestamp)
+    SELECT id, chat_id, sender_id, content, timestamp FROM messages_unpartitioned;
+    DROP TABLE messages_unpartitioned;
+END $$;
+
+COMMIT;
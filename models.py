@@ -1,17 +1,35 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, func
+import re
+from typing import Dict, List, Tuple
+from sqlalchemy import (
+    DDL, Column, Integer, String, Boolean, ForeignKey, Text, DateTime, Index, LargeBinary, UniqueConstraint, event,
+    func, literal_column, text,
+)
+from sqlalchemy.dialects import postgresql  # noqa: F401  registers the typed to_tsvector()/ts_* functions
 from sqlalchemy.orm import relationship
 from database import Base
 
+# Message ids per partition; must match migrations/006 and never change once partitions exist
+MESSAGE_PARTITION_SIZE = 1_000_000
+MESSAGE_PARTITIONS_AHEAD = 3  # Empty partitions kept created past the newest message id
+
+# Text search configuration; must be a literal so queries match the GIN index expression
+FTS_LANGUAGE = literal_column("'english'")
+
 class Chat(Base):
     __tablename__ = "chats"
     id = Column(Integer, primary_key=True, index=True)
     tutor_id = Column(Integer, ForeignKey("users.id"))
     student_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=func.now())
+    archived_through_id = Column(Integer, nullable=True)  # Messages up to this id live in message_archives
 
     tutor = relationship("User", foreign_keys=[tutor_id])
     student = relationship("User", foreign_keys=[student_id])
 
+    __table_args__ = (
+        UniqueConstraint("tutor_id", "student_id", name="uq_chats_tutor_student"),  # One chat per pair
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -24,6 +42,129 @@ class Message(Base):
     chat = relationship("Chat")
     sender = relationship("User")
 
+    __table_args__ = (
+        Index("ix_messages_chat_id_id", "chat_id", "id"),  # Keyset pagination per chat
+        # Full-text search (Postgres); SQLite gets an FTS5 table below instead
+        Index(
+            "ix_messages_content_fts",
+            func.to_tsvector(FTS_LANGUAGE, content),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        # Id-range partitions on Postgres; other dialects get a plain table.
+        # Ids grow with time, so old history sits in old partitions, and
+        # (chat_id, id) reads prune to the partitions their cursor reaches.
+        {"postgresql_partition_by": "RANGE (id)"},
+    )
+
+
+_PARTITION_BOUND = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+
+
+def message_partitions(connection) -> Dict[str, Tuple[int, int]]:
+    """The [start, end) id range of each bounded partition of messages. Sync connection, Postgres only."""
+    rows = connection.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'messages'::regclass"
+    )).all()
+    partitions = {}
+    for name, bound in rows:
+        match = _PARTITION_BOUND.search(bound)
+        if match:  # The default partition has no bounds
+            partitions[name] = (int(match.group(1)), int(match.group(2)))
+    return partitions
+
+
+def ensure_message_partitions(connection, ahead: int = MESSAGE_PARTITIONS_AHEAD) -> List[str]:
+    """
+    Create partitions of messages through `ahead` blocks past the newest id,
+    plus the default partition. Rows that landed in the default partition
+    because upkeep fell behind are moved into the partition created for them.
+
+    Sync connection, Postgres only; idempotent. Returns the partitions created.
+    """
+    size = MESSAGE_PARTITION_SIZE
+    # One run at a time across workers, cron and migrations
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('messages partitions'))"))
+    connection.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+
+    existing = list(message_partitions(connection).values())
+    newest = connection.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar()
+    stray = set(connection.execute(
+        text("SELECT DISTINCT id / :size FROM messages_default"), {"size": size}
+    ).scalars())
+
+    created = []
+    for block in sorted(set(range(newest // size, newest // size + ahead + 1)) | stray):
+        start, end = block * size, (block + 1) * size
+        if any(low <= start < high for low, high in existing):
+            continue
+        name = f"messages_p{block}"
+        if block in stray:
+            # The default partition already holds rows in this range, so the
+            # partition can't be created in place: build it standalone, move
+            # the rows across and attach it
+            connection.execute(text(f"CREATE TABLE {name} (LIKE messages INCLUDING DEFAULTS)"))
+            connection.execute(text(
+                f"WITH moved AS (DELETE FROM messages_default WHERE id >= {start} AND id < {end} RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ))
+            connection.execute(text(f"ALTER TABLE messages ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})"))
+        else:
+            connection.execute(text(f"CREATE TABLE {name} PARTITION OF messages FOR VALUES FROM ({start}) TO ({end})"))
+        created.append(name)
+    return created
+
+
+@event.listens_for(Message.__table__, "after_create")
+def _create_message_partitions(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        ensure_message_partitions(connection)
+
+
+# SQLite stand-in for the GIN index: an external-content FTS5 table kept in sync by triggers
+for _statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+):
+    event.listen(Message.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Message.__table__, "before_drop", DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"))
+
+
+class MessageArchive(Base):
+    """A chunk of a chat's old history, moved out of the hot messages table."""
+
+    __tablename__ = "message_archives"
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    # The chunk's newest message, for inbox previews of chats with no hot messages
+    last_sender_id = Column(Integer)
+    last_timestamp = Column(DateTime)
+    last_content = Column(Text)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON rows
+    archived_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_message_archives_chat_id_last_message_id", "chat_id", "last_message_id"),
+    )
+
+
+class ChatReadCursor(Base):
+    __tablename__ = "chat_read_cursors"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
+    last_read_message_id = Column(Integer, nullable=False, default=0)  # Highest message id the user has seen
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 
 class User(Base):
     __tablename__ = "users"
@@ -37,6 +178,14 @@ class User(Base):
 
     course = relationship("Course", back_populates="users", lazy="joined")  # Use lazy="joined" to fetch data eagerly
 
+    __table_args__ = (
+        # Trigram index for prefix (ILIKE) and fuzzy (%) tutor search
+        Index(
+            "ix_users_username_trgm", "username",
+            postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
 
 class Course(Base):
     __tablename__ = "courses"
@@ -47,3 +196,16 @@ class Course(Base):
 
     users = relationship("User", back_populates="course")  # Back-populates the relationship
 
+    __table_args__ = (
+        Index(
+            "ix_courses_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# The trigram indexes above need pg_trgm
+event.listen(
+    Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
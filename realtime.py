@@ -0,0 +1,85 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import logging
+
+logger = logging.getLogger("uvicorn.error")
+
+HEARTBEAT_INTERVAL = 25  # seconds between pings on an idle socket
+SUBSCRIBER_QUEUE_SIZE = 100  # pending events per subscriber before it is dropped
+
+# Put on a subscriber's queue when it fell too far behind and must resync
+OVERFLOW = None
+
+
+class ChatHub(ABC):
+    """
+    Pub/sub interface for pushing new chat events to connected clients.
+
+    The in-process hub below only reaches sockets on the same worker; a
+    multi-worker deployment can swap in a broker-backed implementation
+    (e.g. Redis pub/sub) via `set_hub` without touching the routes.
+    """
+
+    @abstractmethod
+    async def publish(self, chat_id: int, event: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, chat_id: int):
+        """Async context manager yielding an `asyncio.Queue` of events for the chat."""
+
+
+class InProcessHub(ChatHub):
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, chat_id: int, event: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers.get(chat_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Backpressure: never block the publisher on a slow reader.
+                # Drop its backlog and tell it to resync from the REST endpoint.
+                logger.warning(f"Subscriber on chat {chat_id} fell behind, dropping it")
+                self._unsubscribe(chat_id, queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    @asynccontextmanager
+    async def subscribe(self, chat_id: int) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[chat_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._unsubscribe(chat_id, queue)
+
+    def subscriber_count(self, chat_id: Optional[int] = None) -> int:
+        if chat_id is not None:
+            return len(self._subscribers.get(chat_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _unsubscribe(self, chat_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(chat_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[chat_id]
+
+
+_hub: ChatHub = InProcessHub()
+
+
+def get_hub() -> ChatHub:
+    return _hub
+
+
+def set_hub(hub: ChatHub) -> None:
+    global _hub
+    _hub = hub
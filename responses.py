@@ -0,0 +1,37 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# Bodies smaller than this aren't worth compressing
+COMPRESSION_MIN_SIZE = 1024
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjson encoding with native datetime support and Pydantic models as a fallback."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """Project-wide response class; set as the app's default_response_class."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def trusted_response(rows: Any) -> FastJSONResponse:
+    """
+    Encode rows that already have exactly the response model's fields.
+
+    Returning a Response skips FastAPI's response_model validation and
+    jsonable_encoder pass, so only use it for projections selected to match
+    the model (the route keeps response_model for the OpenAPI schema).
+    """
+    return FastJSONResponse(rows)
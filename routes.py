@@ -1,38 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import text
-from sqlalchemy.orm import Session, joinedload, aliased
-from passlib.context import CryptContext
-from database import get_db
-from models import Chat, Course, Message, User
-from schema import ChatCreate, CourseRead, MessageCreate, ChatResponse, MessageResponse, UserRead
-from typing import List
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from cache import cached_json, catalog_cache, lookup_cache
+from database import SessionLocal, get_db
+from models import Chat, ChatReadCursor, Course, Message, MessageArchive, User
+from schema import (
+    ChatCreate, ChatReadResponse, ChatReadUpdate, CourseRead, MessageBatchCreate, MessageCreate,
+    ChatResponse, MessageResponse, MessageSearchResult, UserRead,
+)
+from typing import List, Optional
+from security import Principal, authenticate_token, create_access_token, get_current_user, revoked_tokens, verify_password
+from streaming import stream_rows, wants_stream
+from responses import trusted_response
+from realtime import HEARTBEAT_INTERVAL, OVERFLOW, get_hub
+import asyncio
 import logging
 
+# archive, search and tutor_search are imported inside the routes that use
+# them, so a cold start serving anything else doesn't load them
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password, hashed_password):
-    # return pwd_context.verify(plain_password, hashed_password)
-    # Temporarily bypass password hashing for testing
-    return plain_password == hashed_password
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+CHAT_PAGE_SIZE = 50
+MAX_CHAT_PAGE_SIZE = 200
+SNIPPET_LENGTH = 100
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+TUTOR_SEARCH_PAGE_SIZE = 10
+MAX_TUTOR_SEARCH_PAGE_SIZE = 50
 
 # Login endpoint
 @router.post("/login")
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Login with plaintext password comparison (for testing).
+    Login with bcrypt verification run off the event loop.
+
+    Legacy plaintext passwords are rehashed on the first successful login.
     """
     try:
         # logger.info(f"Login attempt for username: {form_data.username}")
         
         # Retrieve the user from the database
-        user = db.query(User).filter(User.username == form_data.username).first()
+        result = await db.execute(select(User).filter(User.username == form_data.username))
+        user = result.scalars().first()
         if not user:
             logger.warning(f"User not found: {form_data.username}")
             raise HTTPException(
@@ -41,8 +60,9 @@ async def login(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Verify the password (plaintext or hashed based on your setup)
-        if not verify_password(form_data.password, user.password):
+        # Verify the password (bcrypt, or legacy plaintext awaiting upgrade)
+        valid, new_hash = await verify_password(form_data.password, user.password)
+        if not valid:
             logger.warning(f"Password mismatch for user: {form_data.username}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,8 +70,14 @@ async def login(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        if new_hash:
+            user.password = new_hash
+            await db.commit()
+            logger.info(f"Upgraded password hash for user: {form_data.username}")
+
         # logger.info(f"Login successful for username: {form_data.username}")
-        return {"access_token": user.id, "token_type": "bearer"}
+        access_token, expires_in = create_access_token(user.id, user.username, user.isTutor)
+        return {"access_token": access_token, "token_type": "bearer", "expires_in": expires_in}
 
     except HTTPException as e:
         raise e  # Re-raise expected HTTP exceptions
@@ -64,72 +90,207 @@ async def login(
         )
 
 
+# Revoke the caller's token
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(principal: Principal = Depends(get_current_user)):
+    revoked_tokens.revoke(principal.jti, principal.expires_at)
+
+
 # Create a new chat
 @router.post("/chats/", response_model=ChatResponse)
-async def create_chat(chat_data: ChatCreate, db: Session = Depends(get_db)):
-    tutor = db.query(User).filter(User.id == chat_data.tutor_id, User.isTutor == True).first()
-    student = db.query(User).filter(User.id == chat_data.student_id, User.isTutor == False).first()
-    if not tutor or not student:
-        raise HTTPException(status_code=400, detail="Invalid tutor or student ID")
+async def create_chat(
+    chat_data: ChatCreate,
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get-or-create in a single statement.
+
+    The INSERT selects from the tutor/student validity check, so it inserts
+    nothing when either ID is wrong. ON CONFLICT on the (tutor_id,
+    student_id) constraint makes concurrent calls for the same pair return
+    the same row. DO UPDATE is used rather than DO NOTHING because only
+    DO UPDATE returns the existing row.
+    """
+    if principal.id not in [chat_data.tutor_id, chat_data.student_id]:
+        raise HTTPException(status_code=403, detail="Cannot create a chat you are not part of")
+
+    Tutor = aliased(User)
+    Student = aliased(User)
+    valid_pair = (
+        select(Tutor.id, Student.id)
+        .select_from(Tutor)
+        .join(Student, Student.id == chat_data.student_id)
+        .filter(Tutor.id == chat_data.tutor_id, Tutor.isTutor == True, Student.isTutor == False)
+    )
 
-    existing_chat = db.query(Chat).filter_by(tutor_id=chat_data.tutor_id, student_id=chat_data.student_id).first()
-    if existing_chat:
-        return existing_chat
+    insert_for_dialect = sqlite_insert if db.bind.dialect.name == "sqlite" else pg_insert
+    statement = insert_for_dialect(Chat).from_select([Chat.tutor_id, Chat.student_id], valid_pair)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Chat.tutor_id, Chat.student_id],
+        set_={"tutor_id": statement.excluded.tutor_id},
+    ).returning(Chat.id, Chat.tutor_id, Chat.student_id, Chat.created_at)
 
-    new_chat = Chat(tutor_id=chat_data.tutor_id, student_id=chat_data.student_id)
-    db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
-    return new_chat
+    chat = (await db.execute(statement)).mappings().first()
+    if not chat:
+        raise HTTPException(status_code=400, detail="Invalid tutor or student ID")
+    await db.commit()
+    return chat
 
 # Send a message
 @router.post("/messages/", response_model=MessageResponse)
-async def send_message(message_data: MessageCreate, db: Session = Depends(get_db)):
-    chat = db.query(Chat).filter(Chat.id == message_data.chat_id).first()
+async def send_message(
+    message_data: MessageCreate,
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    chat = await db.get(Chat, message_data.chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    if message_data.sender_id not in [chat.tutor_id, chat.student_id]:
+    if principal.id not in [chat.tutor_id, chat.student_id]:
         raise HTTPException(status_code=403, detail="Sender not part of this chat")
 
     message = Message(
         chat_id=message_data.chat_id,
-        sender_id=message_data.sender_id,
+        sender_id=principal.id,
         content=message_data.content
     )
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
+
+    # Push to anyone listening on this chat's socket
+    payload = MessageResponse.model_validate(message).model_dump(mode="json")
+    await get_hub().publish(message.chat_id, {"type": "message", "message": payload})
     return message
 
+# Send many messages at once
+@router.post("/messages/batch", response_model=List[MessageResponse])
+async def send_messages_batch(
+    batch: MessageBatchCreate,
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Insert a batch of messages in one round-trip.
+
+    Membership for every chat in the batch is checked with a single query and
+    all rows go in as one multi-row INSERT ... RETURNING. The batch is
+    all-or-nothing: one bad item rejects the whole request.
+    """
+    chat_ids = {item.chat_id for item in batch.messages}
+    result = await db.execute(
+        select(Chat.id, Chat.tutor_id, Chat.student_id).filter(Chat.id.in_(chat_ids))
+    )
+    members = {chat.id: (chat.tutor_id, chat.student_id) for chat in result}
+
+    for item in batch.messages:
+        if item.chat_id not in members:
+            raise HTTPException(status_code=404, detail=f"Chat not found: {item.chat_id}")
+        if principal.id not in members[item.chat_id]:
+            raise HTTPException(status_code=403, detail=f"Sender not part of chat {item.chat_id}")
+
+    result = await db.execute(
+        insert(Message)
+        .values([{**item.model_dump(), "sender_id": principal.id} for item in batch.messages])
+        .returning(Message.id, Message.chat_id, Message.sender_id, Message.content, Message.timestamp)
+    )
+    messages = sorted((dict(row) for row in result.mappings()), key=lambda message: message["id"])
+    await db.commit()
+
+    hub = get_hub()
+    for message in messages:
+        payload = MessageResponse.model_validate(message).model_dump(mode="json")
+        await hub.publish(message["chat_id"], {"type": "message", "message": payload})
+    return trusted_response(messages)
+
 # Get all chats for a user
 @router.get("/chats/{user_id}")
-async def get_user_chats(user_id: int, db: Session = Depends(get_db)):
-    try:
-        # Fetch the user to verify existence
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+async def get_user_chats(
+    user_id: int,
+    limit: int = Query(CHAT_PAGE_SIZE, ge=1, le=MAX_CHAT_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Inbox for a user, most recently active chat first.
 
+    Each chat carries its last message snippet and the user's unread count,
+    all computed in one query against the (chat_id, id) message index. Chats
+    whose history is all archived take their last message from the newest
+    archive chunk.
+    """
+    if principal.id != user_id:
+        raise HTTPException(status_code=403, detail="Cannot list another user's chats")
+
+    try:
         # Aliases for the tutor and student relationships
         Tutor = aliased(User)
         Student = aliased(User)
 
+        LastMessage = aliased(Message)
+        LastChunk = aliased(MessageArchive)
+
+        # Newest message id per chat; correlated so it stays portable (no LATERAL)
+        last_message_id = (
+            select(func.max(Message.id))
+            .filter(Message.chat_id == Chat.id)
+            .correlate(Chat)
+            .scalar_subquery()
+        )
+        # Messages from the other participant past this user's read cursor
+        unread_count = (
+            select(func.count(Message.id))
+            .filter(
+                Message.chat_id == Chat.id,
+                Message.sender_id != user_id,
+                Message.id > func.coalesce(ChatReadCursor.last_read_message_id, 0),
+            )
+            .correlate(Chat, ChatReadCursor)
+            .scalar_subquery()
+        )
+        last_activity = func.coalesce(LastMessage.timestamp, LastChunk.last_timestamp, Chat.created_at)
+
         # Query the chats with proper joins
-        chats = (
-            db.query(
+        result = await db.execute(
+            select(
                 Chat.id,
                 Chat.tutor_id,
                 Tutor.username.label("tutor_name"),
                 Chat.student_id,
                 Student.username.label("student_name"),
                 Chat.created_at,
+                func.coalesce(LastMessage.id, LastChunk.last_message_id).label("last_message_id"),
+                func.substr(
+                    func.coalesce(LastMessage.content, LastChunk.last_content), 1, SNIPPET_LENGTH
+                ).label("last_message"),
+                func.coalesce(LastMessage.sender_id, LastChunk.last_sender_id).label("last_message_sender_id"),
+                last_activity.label("last_activity"),
+                unread_count.label("unread_count"),
             )
+            .select_from(Chat)
             .join(Tutor, Chat.tutor_id == Tutor.id, isouter=True)
             .join(Student, Chat.student_id == Student.id, isouter=True)
+            .join(LastMessage, LastMessage.id == last_message_id, isouter=True)
+            # archived_through_id is the newest chunk's last message id
+            .join(
+                LastChunk,
+                (LastChunk.chat_id == Chat.id) & (LastChunk.last_message_id == Chat.archived_through_id),
+                isouter=True,
+            )
+            .join(
+                ChatReadCursor,
+                (ChatReadCursor.chat_id == Chat.id) & (ChatReadCursor.user_id == user_id),
+                isouter=True,
+            )
             .filter((Chat.student_id == user_id) | (Chat.tutor_id == user_id))
-            .all()
+            .order_by(last_activity.desc(), Chat.id.desc())
+            .limit(limit)
+            .offset(offset)
         )
+        chats = result.all()
 
         # Construct the response dynamically based on the user's role
         response = []
@@ -141,12 +302,17 @@ async def get_user_chats(user_id: int, db: Session = Depends(get_db)):
                 "student_id": chat.student_id,
                 "student_name": chat.student_name,
                 "created_at": chat.created_at,
+                "last_message_id": chat.last_message_id,
+                "last_message": chat.last_message,
+                "last_message_sender_id": chat.last_message_sender_id,
+                "last_activity": chat.last_activity,
+                "unread_count": chat.unread_count,
             }
             # Include only the relevant name based on the user's role
-            if user.id == chat.tutor_id:
+            if user_id == chat.tutor_id:
                 # If the user is a tutor, include only the student's name
                 chat_data.pop("tutor_name")
-            elif user.id == chat.student_id:
+            elif user_id == chat.student_id:
                 # If the user is a student, include only the tutor's name
                 chat_data.pop("student_name")
             response.append(chat_data)
@@ -156,36 +322,210 @@ async def get_user_chats(user_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chats: {str(e)}")
 
+# Mark a chat as read up to a message
+@router.post("/chats/{chat_id}/read", response_model=ChatReadResponse)
+async def mark_chat_read(
+    chat_id: int,
+    read_data: ChatReadUpdate,
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    if principal.id not in [chat.tutor_id, chat.student_id]:
+        raise HTTPException(status_code=403, detail="User not part of this chat")
+
+    # The cursor must point at a message of this chat, hot or archived
+    message_id = read_data.last_read_message_id
+    archived = chat.archived_through_id is not None and 0 < message_id <= chat.archived_through_id
+    if not archived:
+        found = await db.scalar(select(Message.id).filter(Message.id == message_id, Message.chat_id == chat_id))
+        if found is None:
+            raise HTTPException(status_code=400, detail="Message not found in this chat")
+
+    # Upsert; the cursor only ever moves forward
+    sqlite = db.bind.dialect.name == "sqlite"
+    insert_for_dialect = sqlite_insert if sqlite else pg_insert
+    greatest = func.max if sqlite else func.greatest  # SQLite's two-argument max() is scalar
+    statement = insert_for_dialect(ChatReadCursor).values(
+        user_id=principal.id,
+        chat_id=chat_id,
+        last_read_message_id=message_id,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[ChatReadCursor.user_id, ChatReadCursor.chat_id],
+        set_={
+            "last_read_message_id": greatest(
+                ChatReadCursor.last_read_message_id, statement.excluded.last_read_message_id
+            ),
+            "updated_at": func.now(),
+        },
+    ).returning(ChatReadCursor.chat_id, ChatReadCursor.user_id, ChatReadCursor.last_read_message_id)
+
+    result = await db.execute(statement)
+    cursor = result.mappings().one()
+    await db.commit()
+    return cursor
+
 
 
 # Get messages for a chat
 @router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
-async def get_chat_messages(chat_id: int, db: Session = Depends(get_db)):
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+async def get_chat_messages(
+    chat_id: int,
+    request: Request,
+    before: Optional[int] = Query(None, description="Return messages older than this message id"),
+    after: Optional[int] = Query(None, description="Return messages newer than this message id (incremental sync)"),
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_MESSAGE_PAGE_SIZE),
+    stream: bool = Query(False, description="Stream the page as JSON/NDJSON chunks"),
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Keyset-paginated message history, always returned oldest first.
+
+    With no cursor the latest `limit` messages are returned. `before` pages back
+    through older history, `after` fetches only what a client hasn't seen yet.
+    History of inactive chats is read back from `message_archives` as needed.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    messages = db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.timestamp).all()
-    return messages
+    if principal.id not in [chat.tutor_id, chat.student_id]:
+        raise HTTPException(status_code=403, detail="Not part of this chat")
+
+    query = select(
+        Message.id, Message.chat_id, Message.sender_id, Message.content, Message.timestamp
+    ).filter(Message.chat_id == chat_id)
+    if chat.archived_through_id is not None:
+        # Archived rows can linger in a partition that hasn't been dropped yet
+        query = query.filter(Message.id > chat.archived_through_id)
+    if after is not None:
+        # Walk forward from the cursor, served by the (chat_id, id) index
+        query = query.filter(Message.id > after).order_by(Message.id.asc())
+    else:
+        if before is not None:
+            query = query.filter(Message.id < before)
+        query = query.order_by(Message.id.desc())
+
+    query = query.limit(limit)
+
+    if chat.archived_through_id is None and wants_stream(request, stream):
+        page = query.subquery()
+        return stream_rows(request, select(page).order_by(page.c.id))
+
+    result = await db.execute(query)
+    messages = [dict(row) for row in result.mappings()]
+    if after is None:
+        messages.reverse()
+
+    # Archived ids all sit below the hot ones, so the archive is only read
+    # when a page reaches back past the oldest hot message
+    archived_through = chat.archived_through_id
+    if archived_through is not None:
+        from archive import load_archived
+
+        if after is not None and after < archived_through:
+            older = await load_archived(db, chat_id, limit, after=after)
+            messages = (older + messages)[:limit]
+        elif after is None and len(messages) < limit:
+            older = await load_archived(db, chat_id, limit - len(messages), before=before)
+            messages = older + messages
+    return trusted_response(messages)
+
+# Search message content across a user's chats
+@router.get("/search/messages", response_model=List[MessageSearchResult])
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    from search import search_messages
+
+    return trusted_response(await search_messages(db, principal.id, q, limit, offset))
+
+# Live updates for a chat
+@router.websocket("/ws/chats/{chat_id}")
+async def chat_updates(websocket: WebSocket, chat_id: int, token: str = Query(...)):
+    """
+    Streams new messages for a chat as they are sent.
+
+    Browsers can't set headers on a WebSocket, so the access token is passed
+    as `?token=`.
+
+    Idle sockets get a ping every HEARTBEAT_INTERVAL seconds. A client that
+    can't keep up is closed with 1013 and should catch up through
+    `GET /chats/{chat_id}/messages?after=<last id>` before reconnecting.
+    """
+    try:
+        principal = authenticate_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+        return
+
+    # Short-lived session so the socket doesn't pin a pooled connection
+    async with SessionLocal() as db:
+        chat = await db.get(Chat, chat_id)
+    if not chat or principal.id not in [chat.tutor_id, chat.student_id]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Chat not found")
+        return
+
+    await websocket.accept()
+    try:
+        async with get_hub().subscribe(chat_id) as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    await websocket.send_json({"type": "ping"})
+                    continue
+
+                if event is OVERFLOW:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Subscriber too slow")
+                    return
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
 
 logger = logging.getLogger("uvicorn.error")
 
+def user_read_query():
+    """
+    Users left-joined to their course, selecting only the `UserRead` columns.
+
+    Shared by every user/tutor listing so each one is a single statement
+    no matter how many rows come back.
+    """
+    return (
+        select(
+            User.id,
+            User.username,
+            User.email,
+            User.isTutor.label("isTutor"),
+            User.course_id,
+            Course.name.label("course_name"),
+        )
+        .select_from(User)
+        .outerjoin(Course, User.course_id == Course.id)
+    )
+
 # Get all users with course name included
 @router.get("/users", response_model=List[UserRead])
-async def get_users(db: Session = Depends(get_db)):
+async def get_users(request: Request, stream: bool = False, db: AsyncSession = Depends(get_db)):
     try:
-        users = (
-            db.query(User)
-            .options(joinedload(User.course))  # Use joinedload to load the related course
-            .all()
-        )
-        user_data = []
-        for user in users:
-            user_dict = user.__dict__
-            course = db.query(Course).filter(Course.id == user.course_id).first()
-            user_dict["course_name"] = course.name if course else None
-            user_data.append(user_dict)
-        return user_data
+        if wants_stream(request, stream):
+            return stream_rows(request, user_read_query())
+
+        result = await db.execute(user_read_query())
+        return trusted_response([dict(row) for row in result.mappings()])
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Internal Server Error: {str(e)}"
@@ -193,17 +533,17 @@ async def get_users(db: Session = Depends(get_db)):
 
 
 @router.get("/test-db")
-async def test_db_connection(db: Session = Depends(get_db)):
+async def test_db_connection(db: AsyncSession = Depends(get_db)):
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"message": "Database connection successful"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
 
 @router.post("/test-login")
-async def test_login(db: Session = Depends(get_db)):
+async def test_login(db: AsyncSession = Depends(get_db)):
     try:
-        user = db.query(User).first()
+        user = (await db.execute(select(User))).scalars().first()
         if user:
             return {"username": user.username, "password": user.password}
         else:
@@ -212,55 +552,50 @@ async def test_login(db: Session = Depends(get_db)):
         return {"error": str(e)}
 
 @router.get("/courses", response_model=List[CourseRead])
-async def get_courses(db: Session = Depends(get_db)):
-    courses = db.query(Course).all()
-    if not courses:
-        raise HTTPException(status_code=404, detail="No courses available")
-    return courses
+async def get_courses(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        courses = (await db.execute(select(Course))).scalars().all()
+        if not courses:
+            raise HTTPException(status_code=404, detail="No courses available")
+        return [CourseRead.model_validate(course) for course in courses]
+
+    return await cached_json(request, catalog_cache, "courses", load)
 
 # Get tutors by course name
 @router.get("/courses/{course_name}/tutors", response_model=List[UserRead])
-async def get_tutors_by_course(course_name: str, db: Session = Depends(get_db)):
-    try:
+async def get_tutors_by_course(course_name: str, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
         # Step 1: Find the course by name
-        course = db.query(Course).filter(Course.name == course_name).first()
+        course = (await db.execute(select(Course).filter(Course.name == course_name))).scalars().first()
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
 
         # Step 2: Find tutors who teach this course
-        tutors = db.query(User).filter(User.isTutor == True, User.course_id == course.id).all()
-        tutor_data = []
-        for tutor in tutors:
-            tutor_dict = tutor.__dict__
-            tutor_dict["course_name"] = course.name
-            tutor_data.append(tutor_dict)
-        return tutor_data
+        result = await db.execute(user_read_query().filter(User.isTutor == True, User.course_id == course.id))
+        return [UserRead.model_validate(dict(row)) for row in result.mappings()]
+
+    try:
+        return await cached_json(request, lookup_cache, ("course_tutors", course_name), load)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 # Get all users with their associated courses
 @router.get("/users_with_courses", response_model=List[UserRead])
-async def get_users_with_courses(db: Session = Depends(get_db)):
+async def get_users_with_courses(request: Request, stream: bool = False, db: AsyncSession = Depends(get_db)):
     """
     Retrieve all users with their associated courses.
+
+    Pass `?stream=true` or `Accept: application/x-ndjson` to stream rows
+    straight from a server-side cursor instead of building the whole list.
     """
     try:
-        # Use joinedload to fetch the related course data eagerly
-        users = db.query(User).options(joinedload(User.course)).all()
-
-        # Build the response with user details and associated course name
-        users_with_courses = [
-            {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "isTutor": user.isTutor,
-                "course_name": user.course.name if user.course else None,
-            }
-            for user in users
-        ]
+        if wants_stream(request, stream):
+            return stream_rows(request, user_read_query())
 
-        return users_with_courses
+        result = await db.execute(user_read_query())
+        return trusted_response([dict(row) for row in result.mappings()])
     except Exception as e:
         logger.error(f"Error in /users_with_courses: {e}")
         raise HTTPException(
@@ -269,33 +604,23 @@ async def get_users_with_courses(db: Session = Depends(get_db)):
         )
     
 @router.get("/tutors", response_model=List[UserRead])
-async def get_tutors(db: Session = Depends(get_db)):
+async def get_tutors(request: Request, db: AsyncSession = Depends(get_db)):
     """
-    Fetch all tutors from the database.
+    Fetch all tutors, served from the catalog cache when warm.
     """
-    try:
+    async def load():
         logger.info("Fetching all tutors")
-        tutors = db.query(User).filter(User.isTutor == True).all()
+        tutors = (await db.execute(user_read_query().filter(User.isTutor == True))).mappings().all()
 
         if not tutors:
             logger.warning("No tutors found")
             return []
 
-        # Map tutors to the `UserRead` schema
-        tutor_list = [
-            UserRead(
-                id=tutor.id,
-                username=tutor.username,
-                email=tutor.email,
-                isTutor=tutor.isTutor,
-                course_id=tutor.course_id,
-                course_name=tutor.course.name if tutor.course else None
-            )
-            for tutor in tutors
-        ]
+        logger.info(f"Tutors fetched: {len(tutors)} tutors found.")
+        return [UserRead.model_validate(dict(tutor)) for tutor in tutors]
 
-        logger.info(f"Tutors fetched: {len(tutor_list)} tutors found.")
-        return tutor_list
+    try:
+        return await cached_json(request, catalog_cache, "tutors", load)
     except Exception as e:
         logger.error(f"Error fetching tutors: {e}")
         raise HTTPException(
@@ -304,26 +629,41 @@ async def get_tutors(db: Session = Depends(get_db)):
         )
 
 
+# Type-ahead tutor search; declared before /tutors/{name} so "search" isn't taken as a name
+@router.get("/tutors/search", response_model=List[UserRead])
+async def search_tutors_endpoint(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(TUTOR_SEARCH_PAGE_SIZE, ge=1, le=MAX_TUTOR_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Prefix and typo-tolerant matching on tutor username and course name,
+    best matches first.
+    """
+    from tutor_search import search_tutors
+
+    return trusted_response(await search_tutors(db, user_read_query(), q, limit, offset))
+
+
 @router.get("/tutors/{name}", response_model=UserRead)
-async def get_tutor_by_name(name: str, db: Session = Depends(get_db)):
-    try:
+async def get_tutor_by_name(name: str, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
         logger.info(f"Fetching tutor with username: {name}")
-        tutor = db.query(User).filter(User.username == name, User.isTutor == True).first()
+        result = await db.execute(user_read_query().filter(User.username == name, User.isTutor == True))
+        tutor = result.mappings().first()
         if not tutor:
             logger.error(f"Tutor with username '{name}' not found.")
             raise HTTPException(status_code=404, detail="Tutor not found")
-        
-        # Explicitly construct the response model
-        response = UserRead(
-            id=tutor.id,
-            username=tutor.username,
-            email=tutor.email,
-            isTutor=tutor.isTutor,
-            course_id=tutor.course_id,
-            course_name=tutor.course.name if tutor.course else None
-        )
+
+        response = UserRead.model_validate(dict(tutor))
         logger.info(f"Tutor response: {response}")
         return response
+
+    try:
+        return await cached_json(request, lookup_cache, ("tutor", name), load)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in /tutors/{name}: {e}")
         raise HTTPException(
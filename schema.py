@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 
@@ -19,8 +19,10 @@ class ChatResponse(BaseModel):
 # Message schemas
 class MessageCreate(BaseModel):
     chat_id: int
-    sender_id: int
-    content: str
+    content: str  # The sender is the authenticated user
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=500)
 
 class MessageResponse(BaseModel):
     id: int
@@ -32,6 +34,22 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class MessageSearchResult(BaseModel):
+    id: int
+    chat_id: int
+    sender_id: int
+    timestamp: datetime
+    snippet: str  # HTML-escaped; matched terms wrapped in <mark></mark>
+    rank: float
+
+class ChatReadUpdate(BaseModel):
+    last_read_message_id: int
+
+class ChatReadResponse(BaseModel):
+    chat_id: int
+    user_id: int
+    last_read_message_id: int
+
 # User schemas
 class UserCreate(BaseModel):
     username: str
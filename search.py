@@ -0,0 +1,104 @@
+import html
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, Float, func, literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import FTS_LANGUAGE, Chat, Message
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+SNIPPET_WORDS = 12
+
+# Neither ts_headline nor FTS5's snippet() escapes the message text, so the
+# database marks matches with these control characters instead. The snippet
+# is HTML-escaped afterwards and only the markers become <mark> tags.
+_MATCH_START = "\x02"
+_MATCH_STOP = "\x03"
+
+_HEADLINE_OPTIONS = literal(
+    f"StartSel={_MATCH_START}, StopSel={_MATCH_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=3, MaxFragments=2"
+)
+
+_FTS5_SEARCH = text(
+    f"""
+    SELECT m.id, m.chat_id, m.sender_id, m.timestamp,
+           snippet(messages_fts, 0, :match_start, :match_stop, '...', {SNIPPET_WORDS}) AS snippet,
+           -bm25(messages_fts) AS rank
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    WHERE messages_fts MATCH :query
+      AND m.chat_id IN (SELECT id FROM chats WHERE tutor_id = :user_id OR student_id = :user_id)
+    ORDER BY bm25(messages_fts), m.id DESC
+    LIMIT :limit OFFSET :offset
+    """
+).columns(timestamp=DateTime, rank=Float)
+
+
+def _render_snippet(row: Dict[str, Any]) -> Dict[str, Any]:
+    snippet = html.escape(row["snippet"] or "")
+    row["snippet"] = snippet.replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_STOP, HIGHLIGHT_STOP)
+    return row
+
+
+def _fts5_query(query: str) -> Optional[str]:
+    # Quote every term so user input can't inject FTS5 operators
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms)
+
+
+async def search_messages(
+    db: AsyncSession, user_id: int, query: str, limit: int, offset: int
+) -> List[Dict[str, Any]]:
+    """
+    Ranked full-text search over messages in chats the user belongs to.
+
+    Postgres uses the GIN index on to_tsvector(content); SQLite (local testing)
+    uses the messages_fts FTS5 table. Snippets are HTML-escaped, with matches
+    wrapped in <mark>.
+    """
+    if db.bind.dialect.name == "sqlite":
+        match = _fts5_query(query)
+        if match is None:
+            return []
+        result = await db.execute(_FTS5_SEARCH, {
+            "query": match, "user_id": user_id, "limit": limit, "offset": offset,
+            "match_start": _MATCH_START, "match_stop": _MATCH_STOP,
+        })
+        return [_render_snippet(dict(row)) for row in result.mappings()]
+
+    tsquery = func.websearch_to_tsquery(FTS_LANGUAGE, query)
+    vector = func.to_tsvector(FTS_LANGUAGE, Message.content)
+    rank = func.ts_rank_cd(vector, tsquery)
+    user_chats = select(Chat.id).filter(or_(Chat.tutor_id == user_id, Chat.student_id == user_id))
+
+    page = (
+        select(
+            Message.id,
+            Message.chat_id,
+            Message.sender_id,
+            Message.content,
+            Message.timestamp,
+            rank.label("rank"),
+        )
+        .filter(vector.op("@@")(tsquery), Message.chat_id.in_(user_chats))
+        .order_by(rank.desc(), Message.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    # ts_headline is costly, so only run it over the page being returned
+    result = await db.execute(
+        select(
+            page.c.id,
+            page.c.chat_id,
+            page.c.sender_id,
+            page.c.timestamp,
+            func.ts_headline(FTS_LANGUAGE, page.c.content, tsquery, _HEADLINE_OPTIONS).label("snippet"),
+            page.c.rank,
+        ).order_by(page.c.rank.desc(), page.c.id.desc())
+    )
+    return [_render_snippet(dict(row)) for row in result.mappings()]
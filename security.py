@@ -0,0 +1,209 @@
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import bcrypt
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+
+from cache import TTLCache
+
+logger = logging.getLogger("uvicorn.error")
+
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+PRINCIPAL_CACHE_SIZE = 4096  # decoded tokens kept to skip signature checks on repeat requests
+
+# Local development only: sign with a random per-process key when no secret
+# is configured. Such tokens die with the process and differ per instance.
+JWT_ALLOW_RANDOM_SECRET = os.getenv("JWT_ALLOW_RANDOM_SECRET", "false").lower() == "true"
+
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+if not JWT_SECRET_KEY:
+    if not JWT_ALLOW_RANDOM_SECRET:
+        raise RuntimeError("JWT_SECRET_KEY is not set; set JWT_ALLOW_RANDOM_SECRET=true to use a throwaway key locally")
+    logger.warning("JWT_SECRET_KEY is not set; using a random per-process key")
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash jobs allowed in flight (running + queued) before logins are shed with 503
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+
+# bcrypt only reads the first 72 bytes. passlib truncated silently and
+# bcrypt>=5 raises instead, so truncate here to keep existing hashes valid.
+BCRYPT_MAX_PASSWORD_BYTES = 72
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+
+
+def is_bcrypt_hash(stored_password: str) -> bool:
+    return stored_password.startswith(_BCRYPT_PREFIXES)
+
+
+def bcrypt_hash(password: str) -> str:
+    """Blocking; request handlers go through `hash_password`."""
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("ascii")
+
+
+def bcrypt_verify(password: str, stored_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Blocking check against a bcrypt hash. Returns (valid, new_hash), with a
+    new hash when the stored one was made below BCRYPT_ROUNDS.
+    """
+    try:
+        valid = bcrypt.checkpw(_password_bytes(password), stored_password.encode("ascii"))
+    except ValueError:
+        # Malformed hash; treat it like a wrong password
+        return False, None
+    if not valid:
+        return False, None
+    rounds = int(stored_password.split("$")[2])
+    return True, bcrypt_hash(password) if rounds < BCRYPT_ROUNDS else None
+
+
+class HashingPool:
+    """
+    Runs bcrypt off the event loop in a bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    without the pickling overhead of a process pool.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0  # Only touched from the event loop thread
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_MAX_PENDING)
+
+
+async def hash_password(plain_password: str) -> str:
+    return await hashing_pool.run(bcrypt_hash, plain_password)
+
+
+async def verify_password(plain_password: str, stored_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password against the stored value.
+
+    Returns (valid, new_hash). `new_hash` is set when the stored value should
+    be replaced: a legacy plaintext row, or a hash below the current cost.
+    """
+    if not is_bcrypt_hash(stored_password):
+        # Legacy plaintext row; upgrade it on the first successful login
+        if not hmac.compare_digest(plain_password.encode("utf-8"), stored_password.encode("utf-8")):
+            return False, None
+        return True, await hash_password(plain_password)
+
+    return await hashing_pool.run(bcrypt_verify, plain_password, stored_password)
+
+
+class Principal(NamedTuple):
+    """The authenticated caller, taken from a verified access token."""
+
+    id: int
+    username: str
+    is_tutor: bool
+    jti: str
+    expires_at: int
+
+
+def create_access_token(user_id: int, username: str, is_tutor: bool) -> Tuple[str, int]:
+    """Returns a signed token and its lifetime in seconds."""
+    now = int(time.time())
+    expires_in = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    claims = {
+        "sub": str(user_id),
+        "name": username,
+        "tutor": bool(is_tutor),
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + expires_in,
+    }
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM), expires_in
+
+
+class RevocationList:
+    """
+    Revoked token ids, held only until the token would have expired anyway.
+
+    Process-local: a multi-instance deployment needs a shared store here.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: int) -> None:
+        with self._lock:
+            self._revoked[jti] = expires_at
+            now = time.time()
+            for expired in [key for key, exp in self._revoked.items() if exp < now]:
+                del self._revoked[expired]
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+
+revoked_tokens = RevocationList()
+_principal_cache = TTLCache(ttl=300, maxsize=PRINCIPAL_CACHE_SIZE)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+def _credentials_error() -> HTTPException:
+    # A fresh instance per raise: re-raising a shared one would keep growing
+    # its __traceback__ and pin every failed request's frames
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def authenticate_token(token: str) -> Principal:
+    """Verify a token without touching the database; raises 401 if it's no good."""
+    principal = _principal_cache.get(token)
+    if principal is None:
+        try:
+            claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM], options={"require": ["exp", "sub", "jti"]})
+            principal = Principal(int(claims["sub"]), claims.get("name", ""), bool(claims.get("tutor")), claims["jti"], claims["exp"])
+        except (jwt.PyJWTError, ValueError):
+            raise _credentials_error() from None
+        _principal_cache.set(token, principal)
+
+    # The cache outlives neither expiry nor revocation
+    if principal.expires_at <= time.time() or principal.jti in revoked_tokens:
+        raise _credentials_error()
+    return principal
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    return authenticate_token(token)
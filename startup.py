@@ -0,0 +1,115 @@
+"""
+Cold-start measurement for serverless instances.
+
+`main.py` imports the app's modules through `timed_import` so each one's
+incremental import cost is recorded, and the first SQL statement's latency
+is captured from engine events. Both are served on /health.
+
+Running this file checks the import budget from a fresh interpreter:
+
+    python startup.py --budget-ms 1500     # exits 1 when over budget
+"""
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import importlib  # noqa: E402
+import os  # noqa: E402
+from typing import Any, Dict, Optional  # noqa: E402
+
+_sqlalchemy_started = time.perf_counter()
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+_SQLALCHEMY_IMPORT_MS = (time.perf_counter() - _sqlalchemy_started) * 1000
+
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+
+class StartupReport:
+    def __init__(self):
+        self.imports: Dict[str, float] = {}
+        self.app_ready_ms: Optional[float] = None
+        self.first_query_ms: Optional[float] = None
+        self.first_query_after_start_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self._first_query_started: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "imports_ms": {name: round(ms, 2) for name, ms in self.imports.items()},
+            "app_ready_ms": self.app_ready_ms,
+            "first_query_ms": self.first_query_ms,
+            "first_query_after_start_ms": self.first_query_after_start_ms,
+            "warmup_ms": self.warmup_ms,
+        }
+
+
+report = StartupReport()
+report.imports["sqlalchemy"] = _SQLALCHEMY_IMPORT_MS
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+def timed_import(name: str):
+    """Import `name`, recording only what it adds on top of already loaded modules."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    report.imports.setdefault(name, (time.perf_counter() - start) * 1000)
+    return module
+
+
+def mark_app_ready() -> None:
+    report.app_ready_ms = _elapsed_ms(PROCESS_STARTED)
+
+
+@event.listens_for(Engine, "before_cursor_execute", once=True)
+def _first_query_started(conn, cursor, statement, parameters, context, executemany):
+    report._first_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute", once=True)
+def _first_query_finished(conn, cursor, statement, parameters, context, executemany):
+    report.first_query_ms = _elapsed_ms(report._first_query_started)
+    report.first_query_after_start_ms = _elapsed_ms(PROCESS_STARTED)
+
+
+async def warm_up() -> None:
+    """
+    Opens the first database connection (TLS handshake included) before
+    traffic arrives. Enabled by WARMUP_ON_STARTUP.
+    """
+    from sqlalchemy import text
+
+    from database import SessionLocal
+
+    start = time.perf_counter()
+    async with SessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+    report.warmup_ms = _elapsed_ms(start)
+
+
+def _measure_import(module: str) -> float:
+    import subprocess
+    import sys
+
+    code = f"import time; s = time.perf_counter(); import {module}; print((time.perf_counter() - s) * 1000)"
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", code], cwd=app_dir, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Check app import time against a budget")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to time; the best run counts")
+    args = parser.parse_args()
+
+    best = min(_measure_import("main") for _ in range(args.runs))
+    print(f"import main: {best:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    sys.exit(0 if best <= args.budget_ms else 1)
@@ -0,0 +1,55 @@
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from database import SessionLocal
+from responses import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 1000  # rows fetched per server-side cursor round-trip
+
+
+def wants_stream(request: Request, stream: bool) -> bool:
+    """Streaming is opt-in via `?stream=true` or an NDJSON Accept header."""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _encode(row: Dict[str, Any]) -> bytes:
+    return dumps(row)
+
+
+async def _iter_json(query: Select, ndjson: bool) -> AsyncIterator[bytes]:
+    # The request's get_db session may already be closed while the body is
+    # still being sent, so the stream owns its own session.
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        first = True
+        if not ndjson:
+            yield b"["
+        async for partition in result.mappings().partitions():
+            chunk = []
+            for row in partition:
+                row = dict(row)
+                if ndjson:
+                    chunk.append(_encode(row) + b"\n")
+                else:
+                    chunk.append(_encode(row) if first else b"," + _encode(row))
+                    first = False
+            yield b"".join(chunk)
+        if not ndjson:
+            yield b"]"
+
+
+def stream_rows(request: Request, query: Select) -> StreamingResponse:
+    """
+    Stream a column-projection query as a JSON array, or as NDJSON when the
+    client accepts it, without materializing the full result set.
+
+    Rows are not re-validated against the response model; `query` should
+    select exactly the response fields.
+    """
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    media_type = NDJSON_MEDIA_TYPE if ndjson else "application/json"
+    return StreamingResponse(_iter_json(query, ndjson), media_type=media_type)
@@ -0,0 +1,71 @@
+"""
+The app runs in-process over ASGI against a throwaway SQLite database, the
+same stand-in loadtest.py uses. The environment is set before any app
+module is imported because database.py and security.py read it at import.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="hivemind-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["JWT_SECRET_KEY"] = "test-secret"
+os.environ["BCRYPT_ROUNDS"] = "4"  # bcrypt's minimum; the cost factor isn't under test
+os.environ["DB_POOL_MODE"] = "queue"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from cache import invalidate_catalog  # noqa: E402
+from database import Base, SessionLocal, get_engine  # noqa: E402
+from models import Course, User  # noqa: E402
+from security import bcrypt_hash, create_access_token  # noqa: E402
+
+TEST_PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+async def db_schema():
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    invalidate_catalog()
+    yield engine
+    # Pooled aiosqlite connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db_schema):
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(db_schema):
+    """Insert a user and return (id, bearer headers)."""
+    password_hash = bcrypt_hash(TEST_PASSWORD)
+
+    async def make(username: str, is_tutor: bool = False, course: str = None, password: str = None):
+        async with SessionLocal() as db:
+            course_id = None
+            if course is not None:
+                row = Course(name=course)
+                db.add(row)
+                await db.flush()
+                course_id = row.id
+            user = User(
+                username=username,
+                email=f"{username}@example.com",
+                password=password if password is not None else password_hash,
+                isTutor=is_tutor,
+                course_id=course_id,
+            )
+            db.add(user)
+            await db.commit()
+            token, _ = create_access_token(user.id, username, is_tutor)
+            return user.id, {"Authorization": f"Bearer {token}"}
+
+    return make
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from archive import ARCHIVE_AFTER_DAYS, archive_old_messages
+from database import SessionLocal
+from models import Message, MessageArchive
+
+MESSAGE_COUNT = 12
+
+
+async def make_chat(client, make_user, count: int = MESSAGE_COUNT):
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    student_id, _ = await make_user("student")
+    chat_id = (await client.post("/chats/", json={"tutor_id": tutor_id, "student_id": student_id}, headers=tutor_headers)).json()["id"]
+    messages = (await client.post(
+        "/messages/batch",
+        json={"messages": [{"chat_id": chat_id, "content": f"message {i}"} for i in range(count)]},
+        headers=tutor_headers,
+    )).json()
+    return chat_id, tutor_id, tutor_headers, [message["id"] for message in messages]
+
+
+async def age_messages(through_id: int) -> None:
+    old = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS + 10)
+    async with SessionLocal() as db:
+        await db.execute(update(Message).filter(Message.id <= through_id).values(timestamp=old))
+        await db.commit()
+
+
+async def test_old_messages_read_through_the_archive(client, make_user, monkeypatch):
+    monkeypatch.setattr("archive.ARCHIVE_CHUNK_SIZE", 5)
+    chat_id, _, headers, ids = await make_chat(client, make_user)
+    await age_messages(ids[7])
+
+    assert await archive_old_messages() == {"chats": 1, "messages": 8, "partitions_dropped": 0}
+    async with SessionLocal() as db:
+        assert await db.scalar(select(func.count()).select_from(Message)) == 4
+    # A second pass finds nothing new
+    assert (await archive_old_messages())["messages"] == 0
+
+    response = await client.get(f"/chats/{chat_id}/messages", params={"limit": 50}, headers=headers)
+    assert [message["id"] for message in response.json()] == ids
+
+    # Page backwards from the hot rows into the archive, across chunk edges
+    page = (await client.get(f"/chats/{chat_id}/messages", params={"limit": 6}, headers=headers)).json()
+    assert [message["id"] for message in page] == ids[6:]
+    page = (await client.get(f"/chats/{chat_id}/messages", params={"limit": 6, "before": ids[6]}, headers=headers)).json()
+    assert [message["id"] for message in page] == ids[:6]
+    page = (await client.get(f"/chats/{chat_id}/messages", params={"limit": 6, "after": ids[2]}, headers=headers)).json()
+    assert [message["id"] for message in page] == ids[3:9]
+
+
+async def test_inbox_previews_fully_archived_chat(client, make_user):
+    chat_id, tutor_id, headers, ids = await make_chat(client, make_user, count=3)
+    await age_messages(ids[-1])
+    await archive_old_messages()
+
+    [chat] = (await client.get(f"/chats/{tutor_id}", headers=headers)).json()
+    assert chat["id"] == chat_id
+    assert chat["last_message_id"] == ids[-1]
+    assert chat["last_message"] == "message 2"
+    assert chat["last_message_sender_id"] == tutor_id
+
+
+async def test_concurrent_passes_archive_each_message_once(client, make_user, monkeypatch):
+    monkeypatch.setattr("archive.ARCHIVE_CHUNK_SIZE", 3)
+    chat_id, _, headers, ids = await make_chat(client, make_user)
+    await age_messages(ids[7])
+
+    # As when every worker's loop and a cron run fire together
+    results = await asyncio.gather(*(archive_old_messages() for _ in range(3)))
+    assert sum(result["messages"] for result in results) == 8
+    async with SessionLocal() as db:
+        assert await db.scalar(select(func.sum(MessageArchive.message_count))) == 8
+
+    response = await client.get(f"/chats/{chat_id}/messages", params={"limit": 50}, headers=headers)
+    assert [message["id"] for message in response.json()] == ids
@@ -0,0 +1,69 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from database import SessionLocal
+from models import Chat
+
+CONCURRENT_CREATES = 20
+
+
+async def test_concurrent_creates_make_one_chat_per_pair(client, make_user):
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    student_id, student_headers = await make_user("student")
+    body = {"tutor_id": tutor_id, "student_id": student_id}
+
+    responses = await asyncio.gather(*(
+        client.post("/chats/", json=body, headers=tutor_headers if i % 2 else student_headers)
+        for i in range(CONCURRENT_CREATES)
+    ))
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_CREATES
+    assert len({response.json()["id"] for response in responses}) == 1
+    async with SessionLocal() as db:
+        count = await db.scalar(
+            select(func.count()).select_from(Chat).filter(Chat.tutor_id == tutor_id, Chat.student_id == student_id)
+        )
+    assert count == 1
+
+
+async def test_create_chat_rejects_invalid_pair(client, make_user):
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    other_tutor_id, _ = await make_user("other", is_tutor=True)
+
+    response = await client.post("/chats/", json={"tutor_id": tutor_id, "student_id": other_tutor_id}, headers=tutor_headers)
+    assert response.status_code == 400
+
+
+async def make_chat_with_messages(client, make_user, count: int = 3):
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    student_id, student_headers = await make_user("student")
+    chat_id = (await client.post("/chats/", json={"tutor_id": tutor_id, "student_id": student_id}, headers=tutor_headers)).json()["id"]
+    messages = (await client.post(
+        "/messages/batch",
+        json={"messages": [{"chat_id": chat_id, "content": f"message {i}"} for i in range(count)]},
+        headers=tutor_headers,
+    )).json()
+    return chat_id, [message["id"] for message in messages], tutor_headers, student_id, student_headers
+
+
+async def test_read_cursor_moves_forward_only(client, make_user):
+    chat_id, message_ids, _, student_id, student_headers = await make_chat_with_messages(client, make_user)
+
+    response = await client.post(f"/chats/{chat_id}/read", json={"last_read_message_id": message_ids[1]}, headers=student_headers)
+    assert response.status_code == 200
+    assert response.json() == {"chat_id": chat_id, "user_id": student_id, "last_read_message_id": message_ids[1]}
+
+    response = await client.post(f"/chats/{chat_id}/read", json={"last_read_message_id": message_ids[0]}, headers=student_headers)
+    assert response.json()["last_read_message_id"] == message_ids[1]
+
+    inbox = (await client.get(f"/chats/{student_id}", headers=student_headers)).json()
+    assert inbox[0]["unread_count"] == 1
+
+
+async def test_read_cursor_must_be_a_message_in_the_chat(client, make_user):
+    chat_id, message_ids, _, _, student_headers = await make_chat_with_messages(client, make_user)
+
+    for bogus in (message_ids[-1] + 1000, 0, -5):
+        response = await client.post(f"/chats/{chat_id}/read", json={"last_read_message_id": bogus}, headers=student_headers)
+        assert response.status_code == 400
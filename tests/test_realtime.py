@@ -0,0 +1,100 @@
+import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from database import get_engine
+from realtime import OVERFLOW, InProcessHub, get_hub, set_hub
+
+
+@pytest.fixture
+async def socket_client(client, make_user):
+    """
+    A chat between a tutor and a student, and a TestClient for its socket.
+
+    TestClient serves the app on its own event loop, so the pooled
+    connections made during setup are released first.
+    """
+    from main import app
+
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    student_id, _ = await make_user("student")
+    _, outsider_headers = await make_user("outsider")
+    chat_id = (await client.post(
+        "/chats/", json={"tutor_id": tutor_id, "student_id": student_id}, headers=tutor_headers
+    )).json()["id"]
+    await get_engine().dispose()
+
+    with TestClient(app) as test_client:
+        yield test_client, chat_id, tutor_headers, outsider_headers
+    await get_engine().dispose()
+
+
+def token(headers) -> str:
+    return headers["Authorization"].split(" ", 1)[1]
+
+
+async def test_socket_delivers_sent_messages(socket_client):
+    test_client, chat_id, headers, _ = socket_client
+
+    with test_client.websocket_connect(f"/ws/chats/{chat_id}?token={token(headers)}") as socket:
+        response = test_client.post("/messages/", json={"chat_id": chat_id, "content": "hello"}, headers=headers)
+        assert response.status_code == 200
+        event = socket.receive_json()
+    assert event["type"] == "message"
+    assert event["message"]["id"] == response.json()["id"]
+    assert event["message"]["content"] == "hello"
+
+
+async def test_socket_rejects_bad_token_and_non_members(socket_client):
+    test_client, chat_id, _, outsider_headers = socket_client
+
+    for query in ("token=not-a-token", f"token={token(outsider_headers)}"):
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with test_client.websocket_connect(f"/ws/chats/{chat_id}?{query}") as socket:
+                socket.receive_json()
+        assert excinfo.value.code == 1008
+
+
+async def test_idle_socket_gets_pings(socket_client, monkeypatch):
+    monkeypatch.setattr("routes.HEARTBEAT_INTERVAL", 0.05)
+    test_client, chat_id, headers, _ = socket_client
+
+    with test_client.websocket_connect(f"/ws/chats/{chat_id}?token={token(headers)}") as socket:
+        assert socket.receive_json() == {"type": "ping"}
+
+
+async def test_slow_socket_is_closed_with_1013(socket_client):
+    test_client, chat_id, headers, _ = socket_client
+    previous = get_hub()
+    hub = InProcessHub(queue_size=1)
+    set_hub(hub)
+    try:
+        with test_client.websocket_connect(f"/ws/chats/{chat_id}?token={token(headers)}") as socket:
+            async def burst():
+                # No await yields to the socket in between, so the second event overflows
+                for i in range(3):
+                    await hub.publish(chat_id, {"type": "message", "message": {"id": i}})
+
+            test_client.portal.call(burst)
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                socket.receive_json()
+        assert excinfo.value.code == 1013
+    finally:
+        set_hub(previous)
+
+
+async def test_hub_drops_subscriber_that_falls_behind():
+    hub = InProcessHub(queue_size=2)
+    async with hub.subscribe(1) as slow, hub.subscribe(1) as fast:
+        await hub.publish(1, {"n": 1})
+        await hub.publish(1, {"n": 2})
+        assert fast.get_nowait() == {"n": 1}
+        await hub.publish(1, {"n": 3})
+
+        # The third event found the slow queue full: its backlog became one resync marker
+        assert slow.qsize() == 1 and slow.get_nowait() is OVERFLOW
+        assert [fast.get_nowait() for _ in range(fast.qsize())] == [{"n": 2}, {"n": 3}]
+        assert hub.subscriber_count(1) == 1
+        await hub.publish(1, {"n": 4})
+        assert slow.empty()
+    assert hub.subscriber_count() == 0
@@ -0,0 +1,17 @@
+async def test_search_snippet_escapes_message_markup(client, make_user):
+    tutor_id, tutor_headers = await make_user("tutor", is_tutor=True)
+    student_id, _ = await make_user("student")
+    chat_id = (await client.post("/chats/", json={"tutor_id": tutor_id, "student_id": student_id}, headers=tutor_headers)).json()["id"]
+    await client.post(
+        "/messages/",
+        json={"chat_id": chat_id, "content": '<script>alert("x")</script> homework <b>due</b>'},
+        headers=tutor_headers,
+    )
+
+    response = await client.get("/search/messages", params={"q": "homework"}, headers=tutor_headers)
+    assert response.status_code == 200
+    [result] = response.json()
+    assert "<script>" not in result["snippet"]
+    assert "&lt;script&gt;" in result["snippet"]
+    assert "<mark>homework</mark>" in result["snippet"]
+    assert "&lt;b&gt;due&lt;/b&gt;" in result["snippet"]
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from conftest import TEST_PASSWORD
+from database import SessionLocal
+from models import User
+from security import authenticate_token, bcrypt_hash, bcrypt_verify, is_bcrypt_hash
+
+
+async def login(client, username, password):
+    return await client.post("/login", data={"username": username, "password": password})
+
+
+async def test_login_with_bcrypt_hash(client, make_user):
+    await make_user("alice")
+
+    response = await login(client, "alice", TEST_PASSWORD)
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    assert (await login(client, "alice", "wrong")).status_code == 401
+
+
+async def test_legacy_plaintext_password_is_upgraded(client, make_user):
+    user_id, _ = await make_user("bob", password="plaintext-pw")
+
+    assert (await login(client, "bob", "plaintext-pw")).status_code == 200
+
+    async with SessionLocal() as db:
+        stored = (await db.execute(select(User.password).filter(User.id == user_id))).scalar_one()
+    assert is_bcrypt_hash(stored)
+    assert (await login(client, "bob", "plaintext-pw")).status_code == 200
+
+
+def test_long_passwords_are_truncated_like_passlib():
+    # bcrypt>=5 raises on inputs over 72 bytes; only the first 72 count
+    password = "x" * 100
+    stored = bcrypt_hash(password)
+    assert bcrypt_verify(password, stored) == (True, None)
+    assert bcrypt_verify("x" * 72 + "different tail", stored)[0]
+
+
+def test_hash_below_configured_cost_is_replaced(monkeypatch):
+    import security
+
+    stored = bcrypt_hash("pw")
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", security.BCRYPT_ROUNDS + 1)
+    valid, new_hash = bcrypt_verify("pw", stored)
+    assert valid and new_hash is not None
+    assert bcrypt_verify("pw", new_hash) == (True, None)
+
+
+def test_malformed_hash_is_rejected():
+    assert bcrypt_verify("pw", "$2b$not-a-real-hash") == (False, None)
+
+
+def test_rejected_tokens_do_not_share_an_exception():
+    # A shared instance would collect every failed request's frames
+    errors = []
+    for _ in range(3):
+        with pytest.raises(HTTPException) as excinfo:
+            authenticate_token("not-a-token")
+        errors.append(excinfo.value)
+    assert len({id(error) for error in errors}) == 3
+    assert all(error.status_code == 401 and error.__cause__ is None for error in errors)
+    assert all(error.__suppress_context__ for error in errors)
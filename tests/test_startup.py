@@ -0,0 +1,9 @@
+from startup import IMPORT_BUDGET_MS, _measure_import
+
+RUNS = 3
+
+
+def test_import_main_within_budget():
+    # Best of a few fresh interpreters, as `python startup.py` does, to ride out a noisy run
+    best = min(_measure_import("main") for _ in range(RUNS))
+    assert best < IMPORT_BUDGET_MS, f"import main took {best:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
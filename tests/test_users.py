@@ -0,0 +1,64 @@
+import re
+
+import pytest
+from sqlalchemy import insert
+
+from cache import invalidate_catalog
+from database import get_engine
+from models import Course, User
+
+LISTINGS = ["/users", "/users_with_courses", "/tutors", "/tutors/user00001", "/courses/Course 1/tutors"]
+
+
+async def add_users(start: int, count: int) -> None:
+    """Bulk-insert users spread over two courses, every other one a tutor; both courses get tutors."""
+    rows = [
+        {
+            "id": i,
+            "username": f"user{i:05d}",
+            "email": f"user{i:05d}@example.com",
+            "password": "x",
+            User.__table__.c.istutor.key: i % 2 == 1,
+            "course_id": (i // 2) % 2 + 1,
+        }
+        for i in range(start, start + count)
+    ]
+    async with get_engine().begin() as conn:
+        await conn.execute(insert(User), rows)
+
+
+def statement_count(response) -> int:
+    # The metrics middleware reports the request's SQL statements in Server-Timing
+    return int(re.search(r'desc="(\d+) queries"', response.headers["Server-Timing"]).group(1))
+
+
+@pytest.mark.parametrize("path", LISTINGS)
+async def test_listing_statement_count_does_not_grow_with_users(client, path):
+    async with get_engine().begin() as conn:
+        await conn.execute(insert(Course), [{"id": 1, "name": "Course 1"}, {"id": 2, "name": "Course 2"}])
+
+    await add_users(1, 10)
+    small = await client.get(path)
+    assert small.status_code == 200
+
+    await add_users(11, 90)
+    # Bulk Core inserts skip the ORM events that invalidate the catalog cache
+    invalidate_catalog()
+    large = await client.get(path)
+    assert large.status_code == 200
+
+    assert statement_count(large) == statement_count(small) <= 2
+    if isinstance(large.json(), list):
+        assert len(large.json()) > len(small.json())
+
+
+async def test_unknown_tutor_is_404(client):
+    response = await client.get("/tutors/nobody")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Tutor not found"
+
+
+async def test_tutors_of_unknown_course_is_404(client):
+    response = await client.get("/courses/Nope/tutors")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Course not found"
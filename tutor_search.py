@@ -0,0 +1,135 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Set
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from cache import CATALOG_TTL, on_catalog_invalidated
+from models import Course, User
+
+# "db" uses the pg_trgm indexes; "memory" the in-process index below.
+# Unset picks db on Postgres and memory elsewhere (SQLite has no trigrams).
+TUTOR_SEARCH_BACKEND = os.getenv("TUTOR_SEARCH_BACKEND")
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default for the % operator
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams the way pg_trgm builds them: per lowercase word, padded with two leading blanks and one trailing."""
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TutorIndex:
+    """
+    In-memory trigram index over tutors, rebuilt lazily after catalog writes
+    on this instance, or after CATALOG_TTL to pick up writes made elsewhere.
+
+    Candidates come from an inverted trigram index, so a lookup touches only
+    tutors sharing at least one trigram with the query.
+    """
+
+    def __init__(self):
+        self._entries: List[Dict[str, Any]] = []
+        self._keys: List[tuple] = []  # (username, course name, username trigrams, course trigrams)
+        self._postings: Dict[str, Set[int]] = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < CATALOG_TTL
+
+    async def ensure_loaded(self, db: AsyncSession, tutor_query: Select) -> None:
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            result = await db.execute(tutor_query)
+            self._build([dict(row) for row in result.mappings()])
+            self._loaded_at = time.monotonic()
+
+    def _build(self, rows: List[Dict[str, Any]]) -> None:
+        entries, keys, postings = [], [], {}
+        for position, row in enumerate(rows):
+            username = row["username"].lower()
+            course_name = (row.get("course_name") or "").lower()
+            username_grams, course_grams = trigrams(username), trigrams(course_name)
+            for gram in username_grams | course_grams:
+                postings.setdefault(gram, set()).add(position)
+            entries.append(row)
+            keys.append((username, course_name, username_grams, course_grams))
+        self._entries, self._keys, self._postings = entries, keys, postings
+
+    def search(self, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        needle = query.strip().lower()
+        query_grams = trigrams(needle)
+        candidates = set()
+        for gram in query_grams:
+            candidates.update(self._postings.get(gram, ()))
+
+        ranked = []
+        for position in candidates:
+            username, course_name, username_grams, course_grams = self._keys[position]
+            prefix = username.startswith(needle) or course_name.startswith(needle)
+            score = max(similarity(query_grams, username_grams), similarity(query_grams, course_grams))
+            if prefix or score >= SIMILARITY_THRESHOLD:
+                # Prefix hits first, then closest fuzzy matches
+                ranked.append((not prefix, -score, username, position))
+        ranked.sort()
+        return [self._entries[position] for *_, position in ranked[offset:offset + limit]]
+
+
+tutor_index = TutorIndex()
+on_catalog_invalidated(tutor_index.invalidate)
+
+
+def _use_database(db: AsyncSession) -> bool:
+    if TUTOR_SEARCH_BACKEND:
+        return TUTOR_SEARCH_BACKEND == "db"
+    return db.bind.dialect.name == "postgresql"
+
+
+async def search_tutors(
+    db: AsyncSession, user_query: Select, query: str, limit: int, offset: int
+) -> List[Dict[str, Any]]:
+    """
+    Tutors whose username or course name starts with, or approximately
+    matches, `query`. Prefix matches rank first, then by trigram similarity.
+
+    `user_query` is the shared `UserRead` projection (users joined to courses).
+    """
+    tutor_query = user_query.filter(User.isTutor == True)
+    if not _use_database(db):
+        await tutor_index.ensure_loaded(db, tutor_query)
+        return tutor_index.search(query, limit, offset)
+
+    term = query.strip()
+    pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    prefix = or_(User.username.ilike(pattern, escape="\\"), Course.name.ilike(pattern, escape="\\"))
+    score = func.greatest(func.similarity(User.username, term), func.similarity(func.coalesce(Course.name, ""), term))
+
+    result = await db.execute(
+        tutor_query
+        .filter(or_(prefix, User.username.op("%")(term), Course.name.op("%")(term)))
+        .order_by(case((prefix, 0), else_=1), score.desc(), User.username)
+        .limit(limit)
+        .offset(offset)
+    )
+    return [dict(row) for row in result.mappings()]